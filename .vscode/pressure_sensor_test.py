@@ -2,38 +2,183 @@
 MQTT Sensor Test Utility - Fixed for paho-mqtt 2.0
 Verifies sensor data is being received correctly via MQTT
 Tests pressure, motion (PIR), and presence (mmWave) sensors individually
+
+Optional envelope mode (--envelope): publishers may send all readings in one
+JSON message on home/bedroom/state, e.g.
+    {"pressure": 0.42, "motion": "IN", "presence": 120}
+instead of one message per sensor topic.
+
+The message path is fully type-annotated, so the module can be compiled
+ahead of time for slower boards with:  mypyc mqtt_sensor_test_fixed.py
 """
 
 import paho.mqtt.client as mqtt
-import json
+import argparse
+import math
+import re
 import time
+from collections import deque
 from datetime import datetime
+import signal
+import socket
+import sys
 import threading
+from typing import Any, Callable, Optional, Union
+
+# JSON loader for envelopes; bound once so the type checker sees one name
+_loads: Callable[[bytes], Any]
+try:
+    import orjson
+    _loads = orjson.loads  # Faster, parses bytes without a decode step
+except ImportError:
+    import json
+    _loads = json.loads
+
+# A stored sensor value: float (pressure), int (distance) or str (PIR / invalid)
+Reading = Union[float, int, str]
+
+# Seconds between status lines in the single-sensor tests
+STATUS_INTERVAL = 5.0
+
+# Readings arriving faster than this are coalesced to the latest one
+DISPLAY_INTERVAL = 0.05  # 20 Hz
+
+# Bit per sensor in the "changed since last status" mask
+SENSOR_BITS = {'pressure': 1, 'motion': 2, 'presence': 4}
+ALL_SENSORS = 7
+
+# Constant display lines, built once rather than per reading
+SEPARATOR_LINE = "-" * 60
+MOTION_IN_LINE = "            ⚠️ Motion detected - Person IN room"
+MOTION_OUT_LINE = "            ✅ No motion - Person OUT of room"
+PRESENCE_NEAR_LINE = "            👤 Very close (< 50cm)"
+PRESENCE_FAR_LINE = "            🚶 In room (50-200cm)"
+PRESENCE_ABSENT_LINE = "            ⚫ No presence detected"
+FIXED_LINES = (SEPARATOR_LINE, MOTION_IN_LINE, MOTION_OUT_LINE,
+               PRESENCE_NEAR_LINE, PRESENCE_FAR_LINE, PRESENCE_ABSENT_LINE)
+
+# Payload shapes accepted by the numeric parsers (surrounding whitespace ok)
+FLOAT_PAYLOAD = re.compile(rb'\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*')
+INT_PAYLOAD = re.compile(rb'\s*[-+]?\d+\s*')
+
+# Payload parsers return None for malformed input instead of raising
+
+def parse_float(payload: bytes) -> Optional[float]:
+    """Parse a finite numeric payload such as b'0.42' (e.g. pressure in Bar)"""
+    if not FLOAT_PAYLOAD.fullmatch(payload):
+        return None
+    value = float(payload)
+    return value if math.isfinite(value) else None  # e.g. b'1e400' overflows to inf
+
+def parse_int(payload: bytes) -> Optional[int]:
+    """Parse an integer payload such as b'120' (e.g. distance in cm)"""
+    return int(payload) if INT_PAYLOAD.fullmatch(payload) else None
+
+def decode_text(payload: bytes) -> str:
+    """Decode a text payload (e.g. PIR IN/OUT)"""
+    return payload.decode('utf-8', 'replace').strip()
+
+def json_float(value: Any) -> Optional[float]:
+    """Accept a finite JSON number as a float"""
+    if type(value) not in (int, float):
+        return None
+    try:
+        value = float(value)
+    except OverflowError:  # Huge JSON integer
+        return None
+    return value if math.isfinite(value) else None
+
+def json_int(value: Any) -> Optional[int]:
+    """Accept a JSON integer"""
+    return value if type(value) is int else None
+
+def json_text(value: Any) -> Optional[str]:
+    """Accept a JSON string"""
+    return value if type(value) is str else None
+
+class SensorRecord:
+    """Latest reading for one sensor (slots avoid a per-record dict)"""
+    __slots__ = ('value', 'timestamp', 'count')
+    
+    def __init__(self):
+        self.value = None
+        self.timestamp = None
+        self.count = 0
 
 class MQTTSensorTester:
     """Test utility for verifying MQTT sensor connections"""
     
-    def __init__(self, broker_ip="localhost"):
+    def __init__(self, broker_ip="localhost", use_envelope=False):
         self.mqtt_broker = broker_ip
         self.mqtt_port = 1883
+        self.use_envelope = use_envelope
         
-        # Topics from updated technical note
+        # Topics from updated technical note (interned so every table
+        # keyed on them shares one string object)
         self.topics = {
-            'pressure': 'home/bedroom/pressure',
-            'motion': 'home/bedroom/PIR',
-            'presence': 'home/bedroom/presence'
+            'pressure': sys.intern('home/bedroom/pressure'),
+            'motion': sys.intern('home/bedroom/PIR'),
+            'presence': sys.intern('home/bedroom/presence')
+        }
+        
+        # Single JSON envelope carrying every sensor reading
+        self.envelope_topic = sys.intern('home/bedroom/state')
+        
+        # Payload parsers - numeric payloads are parsed straight from bytes
+        self._parsers = {
+            'pressure': parse_float,
+            'motion': decode_text,
+            'presence': parse_int
+        }
+        # Envelope values arrive already decoded by the JSON parser
+        self._envelope_parsers = {
+            'pressure': json_float,
+            'motion': json_text,
+            'presence': json_int
         }
         
+        # Display lines are assembled as bytes in one reused buffer;
+        # constant parts are encoded once here
+        self._encoding = getattr(sys.stdout, 'encoding', None) or 'utf-8'
+        self._linebuf = bytearray(256)
+        self._fixed_lines = {line: self._encode(line + "\n") for line in FIXED_LINES}
+        
+        # Pressure bar graphs for every possible length (0-2.0 Bar)
+        self._bars = [self._encode('█' * i + '░' * (20 - i)) for i in range(41)]
+        
         # Data storage
         self.last_data = {
-            'pressure': {'value': None, 'timestamp': None, 'count': 0},
-            'motion': {'value': None, 'timestamp': None, 'count': 0},
-            'presence': {'value': None, 'timestamp': None, 'count': 0}
+            'pressure': SensorRecord(),
+            'motion': SensorRecord(),
+            'presence': SensorRecord()
         }
         
         self.test_active = False
         self.current_test = None
         
+        # Set by on_message when a reading is stored / by Ctrl+C during a test
+        self._data_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._prev_sigint = None
+        
+        # Readings for the sensor under test, handed from paho's network
+        # thread (sole producer) to the test loop (sole consumer). deque
+        # append/popleft are atomic, so no lock is needed.
+        self._ring = deque(maxlen=4096)
+        
+        # Sensors updated since the all-sensors view last printed them; set
+        # from paho's network thread, swapped out by the monitor loop
+        self._dirty = 0
+        self._dirty_lock = threading.Lock()
+        
+        # Set by on_connect once the broker has answered (rc kept alongside)
+        self._connack_event = threading.Event()
+        self._connack_rc = None
+        
+        # Offset from the monotonic clock to wall-clock time, so messages
+        # can be stamped cheaply and converted only when displayed
+        self._epoch_ns = time.time_ns() - time.monotonic_ns()
+        
         # MQTT Client (Fixed for paho-mqtt 2.0)
         self.client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION1,
@@ -42,11 +187,30 @@ class MQTTSensorTester:
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
+        
+        # One dedicated callback per topic - paho routes to it directly,
+        # so there is no Python-level topic dispatch per message
+        for sensor, topic in self.topics.items():
+            self.client.message_callback_add(topic, self._make_topic_handler(sensor))
+        self.client.message_callback_add(self.envelope_topic, self.on_envelope_message)
+        # Log callback errors instead of letting them stop the network thread
+        self.client.suppress_exceptions = True
+        self.client.enable_logger()
     
     def on_connect(self, client, userdata, flags, rc):
         """Callback for MQTT connection"""
+        self._connack_rc = rc
+        self._connack_event.set()
         if rc == 0:
             print("✅ Connected to MQTT Broker")
+            # Larger receive buffer so bursts queue in the kernel rather
+            # than stalling the broker while a callback is running
+            sock = client.socket()
+            if sock is not None:
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                except OSError:
+                    pass
         else:
             print(f"❌ Failed to connect, return code {rc}")
     
@@ -54,78 +218,184 @@ class MQTTSensorTester:
         if rc != 0:
             print(f"⚠️ Unexpected disconnection")
     
-    def on_message(self, client, userdata, msg):
-        """Process incoming MQTT messages"""
+    def on_message(self, client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
+        """Fallback for topics without a dedicated callback"""
+        print(f"⚠️ Unexpected message on {msg.topic}")
+    
+    def _make_topic_handler(self, sensor):
+        """Build a paho callback with the sensor's parser and store bound as locals"""
+        parse = self._parsers[sensor]
+        store = self.store_reading
+        
+        def on_sensor_message(client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
+            timestamp = time.monotonic_ns()
+            payload = msg.payload
+            # Parse once here; invalid payloads are kept as text
+            value = parse(payload)
+            if value is None:
+                value = decode_text(payload)
+            store(sensor, value, timestamp)
+        
+        return on_sensor_message
+    
+    def on_envelope_message(self, client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
+        """Callback for the all-sensors JSON envelope topic"""
+        self.process_envelope(msg.payload, time.monotonic_ns())
+    
+    def process_envelope(self, payload: bytes, timestamp: int) -> None:
+        """Fan out one JSON envelope to every sensor it carries"""
         try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8').strip()
-            timestamp = datetime.now()
-            
-            # Identify sensor
-            sensor = None
-            for s, t in self.topics.items():
-                if topic == t:
-                    sensor = s
-                    break
-            
-            if sensor:
-                self.last_data[sensor]['value'] = payload
-                self.last_data[sensor]['timestamp'] = timestamp
-                self.last_data[sensor]['count'] += 1
-                
-                # Display if testing this sensor
-                if self.current_test == sensor:
-                    self.display_sensor_data(sensor, payload, timestamp)
-                    
-        except Exception as e:
-            print(f"Error processing message: {e}")
+            data = _loads(payload)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            print(f"❌ Invalid envelope: {decode_text(payload)}")
+            return
+        
+        for sensor, parse in self._envelope_parsers.items():
+            if sensor in data:
+                raw = data[sensor]
+                value = parse(raw)
+                if value is None:
+                    value = str(raw)
+                self.store_reading(sensor, value, timestamp)
+    
+    def store_reading(self, sensor: str, value: Reading, timestamp: int) -> None:
+        """Record a parsed reading and queue it if under test"""
+        # Single lookup, then update the record in place
+        record = self.last_data[sensor]
+        record.value = value
+        record.timestamp = timestamp
+        record.count += 1
+        with self._dirty_lock:
+            self._dirty |= SENSOR_BITS[sensor]
+        
+        # Queue for display if testing this sensor
+        if self.current_test == sensor:
+            self._ring.append((sensor, value, timestamp))
+        
+        # Event.set() takes a lock and notifies waiters; skip it while the
+        # consumer has not yet picked up the previous wake-up
+        if not self._data_event.is_set():
+            self._data_event.set()
     
-    def display_sensor_data(self, sensor, value, timestamp):
-        """Display formatted sensor data"""
-        time_str = timestamp.strftime('%H:%M:%S.%f')[:-3]
+    def begin_test(self, sensor=None):
+        """Reset test events and route Ctrl+C to the stop event"""
+        self.current_test = sensor
+        self._ring.clear()
+        self._data_event.clear()
+        self._stop_event.clear()
+        self._prev_sigint = signal.signal(signal.SIGINT, self._on_sigint)
+        self.test_active = True
+    
+    def end_test(self):
+        """Restore Ctrl+C handling after a test"""
+        signal.signal(signal.SIGINT, self._prev_sigint)
+        self.test_active = False
+        self.current_test = None
+    
+    def _on_sigint(self, signum, frame):
+        self._stop_event.set()
+        self._data_event.set()  # Wake anyone waiting for data
+    
+    def wait_for_data(self, timeout):
+        """Block until a new reading arrives; False on timeout or stop"""
+        if not self._data_event.wait(timeout):
+            return False
+        self._data_event.clear()
+        return not self._stop_event.is_set()
+    
+    def drain_readings(self):
+        """Pop every queued reading, oldest first"""
+        ring = self._ring
+        while ring:
+            yield ring.popleft()
+    
+    def display_throttled(self, reading):
+        """Display the latest reading, then hold off for DISPLAY_INTERVAL"""
+        if reading is None:
+            return
+        self.display_sensor_data(*reading)
+        # Anything received meanwhile is coalesced on the next drain
+        self._stop_event.wait(DISPLAY_INTERVAL)
+    
+    def display_sensor_data(self, sensor: str, value: Reading, timestamp: int) -> None:
+        """Display formatted sensor data (timestamp is monotonic ns)"""
+        wall_clock = datetime.fromtimestamp((timestamp + self._epoch_ns) / 1e9)
+        time_str = wall_clock.strftime('%H:%M:%S.%f')[:-3]
+        
+        buf = self._linebuf
+        buf.clear()
+        encode = self._encode
+        fixed = self._fixed_lines
         
         if sensor == 'pressure':
-            try:
-                pressure_bar = float(value)
-                state = self.get_pressure_state(pressure_bar)
-                print(f"[{time_str}] 🛏️ PRESSURE: {pressure_bar:.2f} Bar - {state}")
-                
-                # Visual bar graph
-                bar_length = int(pressure_bar * 20)
-                bar = '█' * bar_length + '░' * (20 - bar_length)
-                print(f"            {bar} ({pressure_bar:.2f}/2.0)")
-                
-            except ValueError:
-                print(f"[{time_str}] ❌ Invalid pressure value: {value}")
+            if isinstance(value, float):
+                state = self.get_pressure_state(value)
+                # Visual bar graph (20 chars per Bar, saturating at 2.0)
+                bar_length = min(max(int(value * 20), 0), 40)
+                buf += encode(f"[{time_str}] 🛏️ PRESSURE: {value:.2f} Bar - {state}\n            ")
+                buf += self._bars[bar_length]
+                buf += encode(f" ({value:.2f}/2.0)\n")
+            else:
+                buf += encode(f"[{time_str}] ❌ Invalid pressure value: {value}\n")
         
         elif sensor == 'motion':
-            state_icon = "🚶" if value == "IN" else "🛑"
-            print(f"[{time_str}] {state_icon} MOTION: {value}")
             if value == "IN":
-                print("            ⚠️ Motion detected - Person IN room")
+                buf += encode(f"[{time_str}] 🚶 MOTION: IN\n")
+                buf += fixed[MOTION_IN_LINE]
             else:
-                print("            ✅ No motion - Person OUT of room")
+                buf += encode(f"[{time_str}] 🛑 MOTION: {value}\n")
+                buf += fixed[MOTION_OUT_LINE]
         
         elif sensor == 'presence':
-            try:
-                distance_cm = int(value)
-                state = self.get_presence_state(distance_cm)
-                print(f"[{time_str}] 📏 PRESENCE: {distance_cm} cm - {state}")
-                
+            if isinstance(value, int):
+                state = self.get_presence_state(value)
+                buf += encode(f"[{time_str}] 📏 PRESENCE: {value} cm - {state}\n")
                 # Visual distance indicator
-                if distance_cm < 50:
-                    print("            👤 Very close (< 50cm)")
-                elif distance_cm < 200:
-                    print("            🚶 In room (50-200cm)")
+                if value < 50:
+                    buf += fixed[PRESENCE_NEAR_LINE]
+                elif value < 200:
+                    buf += fixed[PRESENCE_FAR_LINE]
                 else:
-                    print("            ⚫ No presence detected")
-                    
-            except ValueError:
-                print(f"[{time_str}] ❌ Invalid distance value: {value}")
+                    buf += fixed[PRESENCE_ABSENT_LINE]
+            else:
+                buf += encode(f"[{time_str}] ❌ Invalid distance value: {value}\n")
         
-        print("-" * 60)
+        buf += fixed[SEPARATOR_LINE]
+        self._write_bytes(buf)
+    
+    def _encode(self, text: str) -> bytes:
+        return text.encode(self._encoding, 'replace')
+    
+    def _write_bytes(self, data: bytearray) -> None:
+        """Write pre-encoded output with a single call to the binary stream"""
+        out = getattr(sys.stdout, 'buffer', None)
+        if out is None:
+            sys.stdout.write(data.decode(self._encoding))
+            return
+        sys.stdout.flush()  # Keep ordering with earlier print() output
+        out.write(data)
+        out.flush()
+    
+    def subscription_topics(self, *sensors):
+        """Topics carrying the given sensors (plus the envelope if enabled)"""
+        topics = [self.topics[s] for s in sensors]
+        if self.use_envelope:
+            topics.append(self.envelope_topic)
+        return topics
+    
+    def subscribe_sensors(self, *sensors):
+        """Subscribe to every topic for the sensors in one SUBSCRIBE packet"""
+        topics = self.subscription_topics(*sensors)
+        self.client.subscribe([(topic, 0) for topic in topics])
+        return topics
     
-    def get_pressure_state(self, pressure_bar):
+    def unsubscribe_sensors(self, *sensors):
+        """Unsubscribe from every topic for the sensors in one packet"""
+        self.client.unsubscribe(self.subscription_topics(*sensors))
+    
+    def get_pressure_state(self, pressure_bar: float) -> str:
         """Determine pressure state"""
         if pressure_bar < 0.1:
             return "🟢 EMPTY"
@@ -134,7 +404,7 @@ class MQTTSensorTester:
         else:
             return "🟡 UNCERTAIN"
     
-    def get_presence_state(self, distance_cm):
+    def get_presence_state(self, distance_cm: int) -> str:
         """Determine presence state"""
         if distance_cm < 50:
             return "NEAR"
@@ -152,8 +422,7 @@ class MQTTSensorTester:
         print("Expected: Pressure values in Bar (0.0 - 2.0)")
         print("-" * 60)
         
-        self.current_test = 'pressure'
-        self.client.subscribe(self.topics['pressure'])
+        self.subscribe_sensors('pressure')
         
         print("\n📊 Monitoring pressure sensor...")
         print("   - Press the sensor to see values change")
@@ -161,33 +430,36 @@ class MQTTSensorTester:
         print("   - Or every 30 seconds if no change")
         print("\nPress Ctrl+C to stop\n")
         
-        self.test_active = True
-        start_time = time.time()
+        self.begin_test('pressure')
+        next_status = time.monotonic() + STATUS_INTERVAL
         last_count = 0
         
-        while self.test_active:
-            try:
-                time.sleep(1)
-                
-                # Show status every 5 seconds
-                if time.time() - start_time >= 5:
-                    count = self.last_data['pressure']['count']
-                    if count == last_count:
-                        print(f"⏳ Waiting for data... (received {count} messages)")
-                    last_count = count
-                    start_time = time.time()
-                    
-            except KeyboardInterrupt:
-                break
-        
-        self.client.unsubscribe(self.topics['pressure'])
-        self.test_active = False
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            
+            # Show status every 5 seconds
+            if now >= next_status:
+                count = self.last_data['pressure'].count
+                if count == last_count:
+                    print(f"⏳ Waiting for data... (received {count} messages)")
+                last_count = count
+                next_status += STATUS_INTERVAL
+            
+            # Sleep until a message arrives or the next status is due
+            if self.wait_for_data(next_status - now):
+                latest = None
+                for latest in self.drain_readings():
+                    pass
+                self.display_throttled(latest)
+        
+        self.unsubscribe_sensors('pressure')
+        self.end_test()
         
         # Summary
         print(f"\n📈 Test Summary:")
-        print(f"   Total messages: {self.last_data['pressure']['count']}")
-        if self.last_data['pressure']['value']:
-            print(f"   Last value: {self.last_data['pressure']['value']} Bar")
+        print(f"   Total messages: {self.last_data['pressure'].count}")
+        if self.last_data['pressure'].value is not None:
+            print(f"   Last value: {self.last_data['pressure'].value} Bar")
     
     def test_motion_sensor(self):
         """Test PIR motion sensor"""
@@ -199,8 +471,7 @@ class MQTTSensorTester:
         print("GPIO: Pin 3 (from updated technical note)")
         print("-" * 60)
         
-        self.current_test = 'motion'
-        self.client.subscribe(self.topics['motion'])
+        self.subscribe_sensors('motion')
         
         print("\n📊 Monitoring PIR sensor...")
         print("   - Walk in front of sensor to trigger")
@@ -209,41 +480,42 @@ class MQTTSensorTester:
         print("   - 3 second debounce prevents rapid toggles")
         print("\nPress Ctrl+C to stop\n")
         
-        self.test_active = True
-        start_time = time.time()
+        self.begin_test('motion')
+        next_status = time.monotonic() + STATUS_INTERVAL
         last_state = None
         state_changes = 0
         
-        while self.test_active:
-            try:
-                time.sleep(0.5)
-                
-                # Check for state changes
-                current_state = self.last_data['motion']['value']
-                if current_state and current_state != last_state:
-                    state_changes += 1
-                    last_state = current_state
-                
-                # Status update
-                if time.time() - start_time >= 5:
-                    if self.last_data['motion']['count'] == 0:
-                        print(f"⏳ Waiting for PIR data...")
-                    else:
-                        print(f"📊 State changes: {state_changes} | Messages: {self.last_data['motion']['count']}")
-                    start_time = time.time()
-                    
-            except KeyboardInterrupt:
-                break
-        
-        self.client.unsubscribe(self.topics['motion'])
-        self.test_active = False
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            
+            # Status update
+            if now >= next_status:
+                if self.last_data['motion'].count == 0:
+                    print(f"⏳ Waiting for PIR data...")
+                else:
+                    print(f"📊 State changes: {state_changes} | Messages: {self.last_data['motion'].count}")
+                next_status += STATUS_INTERVAL
+            
+            # Sleep until a message arrives or the next status is due
+            if self.wait_for_data(next_status - now):
+                latest = None
+                for latest in self.drain_readings():
+                    # Check for state changes
+                    current_state = latest[1]
+                    if current_state and current_state != last_state:
+                        state_changes += 1
+                        last_state = current_state
+                self.display_throttled(latest)
+        
+        self.unsubscribe_sensors('motion')
+        self.end_test()
         
         # Summary
         print(f"\n📈 Test Summary:")
-        print(f"   Total messages: {self.last_data['motion']['count']}")
+        print(f"   Total messages: {self.last_data['motion'].count}")
         print(f"   State changes: {state_changes}")
-        if self.last_data['motion']['value']:
-            print(f"   Last state: {self.last_data['motion']['value']}")
+        if self.last_data['motion'].value is not None:
+            print(f"   Last state: {self.last_data['motion'].value}")
     
     def test_presence_sensor(self):
         """Test mmWave presence sensor"""
@@ -255,8 +527,7 @@ class MQTTSensorTester:
         print("UART: RX=GPIO 18, TX=GPIO 19")
         print("-" * 60)
         
-        self.current_test = 'presence'
-        self.client.subscribe(self.topics['presence'])
+        self.subscribe_sensors('presence')
         
         print("\n📊 Monitoring mmWave sensor...")
         print("   - Stand in front of sensor")
@@ -264,45 +535,43 @@ class MQTTSensorTester:
         print("   - Updates every 0.5 seconds")
         print("\nPress Ctrl+C to stop\n")
         
-        self.test_active = True
-        start_time = time.time()
+        self.begin_test('presence')
+        next_status = time.monotonic() + STATUS_INTERVAL
         min_dist = float('inf')
         max_dist = 0
         
-        while self.test_active:
-            try:
-                time.sleep(0.5)
-                
-                # Track min/max
-                if self.last_data['presence']['value']:
-                    try:
-                        dist = int(self.last_data['presence']['value'])
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            
+            # Status update
+            if now >= next_status:
+                if self.last_data['presence'].count == 0:
+                    print(f"⏳ Waiting for mmWave data...")
+                else:
+                    print(f"📊 Range: {min_dist}-{max_dist}cm | Messages: {self.last_data['presence'].count}")
+                next_status += STATUS_INTERVAL
+            
+            # Sleep until a message arrives or the next status is due
+            if self.wait_for_data(next_status - now):
+                latest = None
+                for latest in self.drain_readings():
+                    # Track min/max
+                    dist = latest[1]
+                    if isinstance(dist, int):
                         min_dist = min(min_dist, dist)
                         max_dist = max(max_dist, dist)
-                    except:
-                        pass
-                
-                # Status update
-                if time.time() - start_time >= 5:
-                    if self.last_data['presence']['count'] == 0:
-                        print(f"⏳ Waiting for mmWave data...")
-                    else:
-                        print(f"📊 Range: {min_dist}-{max_dist}cm | Messages: {self.last_data['presence']['count']}")
-                    start_time = time.time()
-                    
-            except KeyboardInterrupt:
-                break
-        
-        self.client.unsubscribe(self.topics['presence'])
-        self.test_active = False
+                self.display_throttled(latest)
+        
+        self.unsubscribe_sensors('presence')
+        self.end_test()
         
         # Summary
         print(f"\n📈 Test Summary:")
-        print(f"   Total messages: {self.last_data['presence']['count']}")
+        print(f"   Total messages: {self.last_data['presence'].count}")
         if min_dist < float('inf'):
             print(f"   Distance range: {min_dist} - {max_dist} cm")
-        if self.last_data['presence']['value']:
-            print(f"   Last distance: {self.last_data['presence']['value']} cm")
+        if self.last_data['presence'].value is not None:
+            print(f"   Last distance: {self.last_data['presence'].value} cm")
     
     def test_all_sensors(self):
         """Monitor all sensors simultaneously"""
@@ -311,74 +580,76 @@ class MQTTSensorTester:
         print("="*60)
         
         # Subscribe to all topics
-        for topic in self.topics.values():
-            self.client.subscribe(topic)
+        for topic in self.subscribe_sensors(*self.topics):
             print(f"Subscribed: {topic}")
         
         print("\n🎯 Monitoring all sensors...")
         print("Press Ctrl+C to stop\n")
         
-        self.test_active = True
-        last_display = time.time()
-        
-        while self.test_active:
-            try:
-                # Display status every 2 seconds
-                if time.time() - last_display >= 2:
-                    print(f"\n📊 SENSOR STATUS [{datetime.now().strftime('%H:%M:%S')}]")
-                    print("-" * 50)
-                    
-                    # Pressure
-                    if self.last_data['pressure']['value']:
-                        p_val = self.last_data['pressure']['value']
-                        try:
-                            p_bar = float(p_val)
-                            p_state = self.get_pressure_state(p_bar)
-                            print(f"🛏️ Pressure: {p_bar:.2f} Bar - {p_state}")
-                        except:
-                            print(f"🛏️ Pressure: {p_val}")
-                    else:
-                        print(f"🛏️ Pressure: No data")
-                    
-                    # Motion
-                    if self.last_data['motion']['value']:
-                        m_val = self.last_data['motion']['value']
-                        m_icon = "🚶" if m_val == "IN" else "🛑"
-                        print(f"{m_icon} Motion:   {m_val}")
-                    else:
-                        print(f"🚶 Motion:   No data")
-                    
-                    # Presence
-                    if self.last_data['presence']['value']:
-                        d_val = self.last_data['presence']['value']
-                        try:
-                            d_cm = int(d_val)
-                            d_state = self.get_presence_state(d_cm)
-                            print(f"📏 Distance: {d_cm} cm - {d_state}")
-                        except:
-                            print(f"📏 Distance: {d_val}")
-                    else:
-                        print(f"📏 Distance: No data")
-                    
-                    # Message counts
-                    print(f"\n📨 Messages received:")
-                    print(f"   Pressure: {self.last_data['pressure']['count']}")
-                    print(f"   Motion:   {self.last_data['motion']['count']}")
-                    print(f"   Presence: {self.last_data['presence']['count']}")
-                    print("-" * 50)
-                    
-                    last_display = time.time()
-                
-                time.sleep(0.1)
-                
-            except KeyboardInterrupt:
-                break
+        self.begin_test()
+        with self._dirty_lock:
+            self._dirty = 0
+        self.display_all_status()
+        
+        # Only wake and print when a sensor has actually changed
+        while not self._stop_event.is_set():
+            if not self.wait_for_data(2.0):
+                continue
+            # Snapshot and clear the changed-sensor mask in one step
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, 0
+            if dirty:
+                self.display_all_status(dirty)
+                # Print at most every 2 seconds under heavy traffic
+                self._stop_event.wait(2.0)
         
         # Unsubscribe all
-        for topic in self.topics.values():
-            self.client.unsubscribe(topic)
+        self.unsubscribe_sensors(*self.topics)
         
-        self.test_active = False
+        self.end_test()
+    
+    def display_all_status(self, changed=ALL_SENSORS):
+        """Print the sensors in the changed mask plus all message counts"""
+        print(f"\n📊 SENSOR STATUS [{datetime.now().strftime('%H:%M:%S')}]")
+        print("-" * 50)
+        
+        # Pressure
+        if changed & SENSOR_BITS['pressure']:
+            p_val = self.last_data['pressure'].value
+            if isinstance(p_val, float):
+                p_state = self.get_pressure_state(p_val)
+                print(f"🛏️ Pressure: {p_val:.2f} Bar - {p_state}")
+            elif p_val:
+                print(f"🛏️ Pressure: {p_val}")
+            else:
+                print(f"🛏️ Pressure: No data")
+        
+        # Motion
+        if changed & SENSOR_BITS['motion']:
+            if self.last_data['motion'].value:
+                m_val = self.last_data['motion'].value
+                m_icon = "🚶" if m_val == "IN" else "🛑"
+                print(f"{m_icon} Motion:   {m_val}")
+            else:
+                print(f"🚶 Motion:   No data")
+        
+        # Presence
+        if changed & SENSOR_BITS['presence']:
+            d_val = self.last_data['presence'].value
+            if isinstance(d_val, int):
+                d_state = self.get_presence_state(d_val)
+                print(f"📏 Distance: {d_val} cm - {d_state}")
+            elif d_val:
+                print(f"📏 Distance: {d_val}")
+            else:
+                print(f"📏 Distance: No data")
+        
+        # Message counts
+        print(f"\n📨 Messages received:")
+        print(f"   Pressure: {self.last_data['pressure'].count}")
+        print(f"   Motion:   {self.last_data['motion'].count}")
+        print(f"   Presence: {self.last_data['presence'].count}")
+        print("-" * 50)
     
     def connect_mqtt(self):
         """Connect to MQTT broker"""
@@ -386,8 +657,11 @@ class MQTTSensorTester:
             print(f"Connecting to MQTT broker at {self.mqtt_broker}...")
             self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
             self.client.loop_start()
-            time.sleep(1)
-            return True
+            # Continue as soon as the broker answers instead of a fixed sleep
+            if not self._connack_event.wait(5.0):
+                print("❌ No response from broker")
+                return False
+            return self._connack_rc == 0
         except Exception as e:
             print(f"❌ Could not connect: {e}")
             print("\nTroubleshooting:")
@@ -404,6 +678,11 @@ class MQTTSensorTester:
 
 def main():
     """Main test menu"""
+    parser = argparse.ArgumentParser(description="MQTT sensor test utility")
+    parser.add_argument('--envelope', action='store_true',
+                        help="also accept JSON envelopes on home/bedroom/state")
+    args = parser.parse_args()
+    
     print("\n" + "="*60)
     print("  🔬 MQTT SENSOR TEST UTILITY")
     print("  Verify Sensor Connections")
@@ -426,7 +705,7 @@ def main():
     
     print(f"\nUsing broker: {broker_ip}")
     
-    tester = MQTTSensorTester(broker_ip)
+    tester = MQTTSensorTester(broker_ip, use_envelope=args.envelope)
     
     # Connect to MQTT
     if not tester.connect_mqtt():
@@ -471,7 +750,7 @@ def main():
                     received.set()
             
             tester.client.message_callback_add(test_topic, test_callback)
-            tester.client.subscribe(test_topic)
+            tester.client.subscribe(test_topic, qos=0)
             time.sleep(0.5)
             tester.client.publish(test_topic, test_msg)
             
@@ -1,15 +1,31 @@
 # simulation.py — v4 IMPROVED with validation, better constants, and robust handling
 import numpy as np
 import pandas as pd
+from collections import Counter
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timedelta
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 from typing import Dict, List, Optional, Tuple
 import math
+import os
 import uuid
 import json
 import logging
 
+try:
+    import orjson  # optional: much faster alert serialization
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; kernels run as plain Python without it
+    def njit(*args, **kwargs):
+        def decorator(fn):
+            return fn
+        return decorator
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -32,6 +48,9 @@ class Config:
     OVEN_OFF_MIN = 3
     
     # Anomaly detection
+    ANOMALY_SCORER = "isolation_forest"  # or "robust_z": per-hour median/MAD, no model fit
+    ROBUST_Z_COLS = ["motion_sum", "room_transitions", "oven_on_frac"]
+    IF_N_JOBS = -1  # parallel tree fit/scoring; 1 avoids pool start-up on single-core boards
     ANOM_PCTL_PER_HOUR = 97.5
     MIN_ALERT_GAP_MIN = 30
     DEBOUNCE_STABLE_REQ = 2
@@ -51,9 +70,30 @@ class Config:
     
     # Data validation
     REQUIRED_COLUMNS = ["hall_motion", "kitchen_motion", "bedroom_motion", "oven_power_w"]
+    MOTION_COLS = ["hall_motion", "kitchen_motion", "bedroom_motion"]
     ROOMS = ["hall", "kitchen", "bedroom"]
 
 
+# Hour of day -> 1 if it falls within quiet hours
+QUIET_LUT = np.array([int(h >= Config.QUIET_START or h < Config.QUIET_END) for h in range(24)],
+                     dtype=np.int8)
+
+# Hour of day -> cyclical encoding used by the window features
+HOUR_SIN = np.array([math.sin(2 * math.pi * h / 24.0) for h in range(24)])
+HOUR_COS = np.array([math.cos(2 * math.pi * h / 24.0) for h in range(24)])
+
+# Fixed alert explanations, formatted once and shared by every alert
+EXPLANATIONS = {
+    "oven_left_on": f"Oven power > {Config.OVEN_W_THR}W for ≥{Config.OVEN_MIN_THR} min",
+    "possible_immobility": (f"No turnover ≥{Config.SLEEP_TURNOVER_THRESHOLD} for "
+                            f"≥{Config.SLEEP_IMMOBILITY_GAP_MIN} min during sleep"),
+    "quiet_motion": "High motion during quiet hours",
+    "unusual_activity": "Unusual activity vs routine",
+    "frequent_transitions": "Frequent room transitions",
+    "activity_spike": "Activity spike",
+}
+
+
 # ============================================================================
 # VALIDATION UTILITIES
 # ============================================================================
@@ -81,7 +121,7 @@ def validate_input_dataframe(df: pd.DataFrame) -> None:
 # ============================================================================
 def is_quiet_hour(hour: int) -> int:
     """Check if hour falls within quiet hours."""
-    return int(hour >= Config.QUIET_START or hour < Config.QUIET_END)
+    return int(QUIET_LUT[hour])
 
 
 def debounce_series(s: pd.Series, stable_req: int = Config.DEBOUNCE_STABLE_REQ) -> pd.Series:
@@ -89,15 +129,42 @@ def debounce_series(s: pd.Series, stable_req: int = Config.DEBOUNCE_STABLE_REQ)
     Debounce binary series: require 'stable_req' consecutive values to change state.
     Handles gaps in data gracefully by treating missing indices as maintaining current state.
     """
+    out = _debounce_kernel(_debounce_codes(s), stable_req)
+    return pd.Series(out, index=s.index, dtype=int)
+
+
+def debounce_frame(df: pd.DataFrame, cols: List[str],
+                   stable_req: int = Config.DEBOUNCE_STABLE_REQ) -> np.ndarray:
+    """Debounce several binary columns in one kernel call; returns (len(cols), len(df)) int8."""
+    codes = np.empty((len(cols), len(df)), dtype=np.int8)
+    for j, col in enumerate(cols):
+        codes[j] = _debounce_codes(df[col])
+    return _debounce_kernel_2d(codes, stable_req)
+
+
+def _debounce_codes(s: pd.Series) -> np.ndarray:
+    """Encode a binary series as contiguous int8 codes (1 = on, 0 = off, -1 = missing)."""
+    values = s.to_numpy()
+    if values.dtype.kind in "biu":
+        # Integer/bool input cannot hold NaN: no sentinel pass needed
+        return np.ascontiguousarray(values == 1, dtype=np.int8)
+    values = s.to_numpy(dtype=float, na_value=np.nan)
+    return np.where(np.isnan(values), -1, values == 1).astype(np.int8)
+
+
+@njit(cache=True, boundscheck=False)
+def _debounce_kernel(values: np.ndarray, stable_req: int) -> np.ndarray:
+    """Debounce state machine over int8 codes (1 = on, 0 = off, -1 = missing)."""
+    out = np.empty(values.shape[0], dtype=np.int8)
     on_count = 0
     off_count = 0
     state = 0
-    out = []
     
-    for v in s.values:
-        if pd.isna(v):
+    for i in range(values.shape[0]):
+        v = values[i]
+        if v == -1:
             # Treat NaN as maintaining current state
-            out.append(state)
+            out[i] = state
             continue
             
         if v == 1:
@@ -110,133 +177,207 @@ def debounce_series(s: pd.Series, stable_req: int = Config.DEBOUNCE_STABLE_REQ)
             on_count = 0
             if state == 1 and off_count >= stable_req:
                 state = 0
-        out.append(state)
+        out[i] = state
     
-    return pd.Series(out, index=s.index, dtype=int)
+    return out
 
 
-def infer_current_room(row: pd.Series, prev_room: Optional[str], rooms: List[str] = Config.ROOMS) -> Optional[str]:
-    """Infer current room from presence sensors."""
-    active = [r for r in rooms if row.get(f"{r}_present", 0) == 1]
-    if not active:
-        return None
-    if prev_room in active:
-        return prev_room
-    return active[0]
+@njit(cache=True, boundscheck=False)
+def _debounce_kernel_2d(values: np.ndarray, stable_req: int) -> np.ndarray:
+    """Row-wise _debounce_kernel over a (n_series, n_samples) code matrix."""
+    out = np.empty(values.shape, dtype=np.int8)
+    for j in range(values.shape[0]):
+        out[j] = _debounce_kernel(values[j], stable_req)
+    return out
 
 
-def count_room_transitions(window_df: pd.DataFrame) -> int:
-    """Count room transitions in a window, handling None values."""
-    rooms = window_df["current_room"].tolist()
-    transitions = 0
-    
-    prev = None
-    for room in rooms:
-        if room is not None and prev is not None and room != prev:
-            transitions += 1
-        if room is not None:
-            prev = room
-    
-    return transitions
+def infer_current_rooms(df: pd.DataFrame, rooms: List[str] = Config.ROOMS,
+                        present: Optional[np.ndarray] = None) -> pd.Categorical:
+    """
+    Infer the current room per row from presence sensors (NaN when none is active).
+    'present' may pass an already built (len(rooms), len(df)) int8 presence matrix.
+    """
+    if present is None:
+        present = np.zeros((len(rooms), len(df)), dtype=np.int8)
+        for j, r in enumerate(rooms):
+            col = f"{r}_present"
+            if col in df.columns:
+                present[j] = df[col].to_numpy() == 1
+    codes = _current_room_kernel(present)
+    return pd.Categorical.from_codes(codes, categories=rooms)
 
 
-def make_features(win: pd.DataFrame) -> Dict:
-    """Extract features from a time window."""
-    feat = {}
+@njit(cache=True, boundscheck=False)
+def _current_room_kernel(present: np.ndarray) -> np.ndarray:
+    """Sticky room trace: keep the previous room while it stays active, else take the first active one."""
+    n_rooms, n_rows = present.shape
+    out = np.empty(n_rows, dtype=np.int8)
+    prev = -1
+    
+    for i in range(n_rows):
+        cur = -1
+        if prev >= 0 and present[prev, i] == 1:
+            cur = prev
+        else:
+            for j in range(n_rooms):
+                if present[j, i] == 1:
+                    cur = j
+                    break
+        out[i] = cur
+        prev = cur
     
-    # Motion features
-    motion_cols = ["hall_motion", "kitchen_motion", "bedroom_motion"]
-    feat["motion_sum"] = float(win[motion_cols].sum().sum())
-    feat["unique_rooms"] = int((win[motion_cols].sum(axis=0) > 0).sum())
+    return out
+
+
+def room_transitions_per_window(current_room: pd.Series, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Count room transitions in each [start, end] window, handling None values."""
+    codes = pd.Categorical(current_room).codes
+    n = len(codes)
+    pos = np.arange(n)
+    valid = codes >= 0
+    
+    # Index of the last known room at or before each position, -1 if none yet
+    last_valid = np.maximum.accumulate(np.where(valid, pos, -1))
+    prev_valid = np.concatenate(([-1], last_valid[:-1]))
+    changed = np.zeros(n, dtype=np.int64)
+    has_prev = valid & (prev_valid >= 0)
+    changed[has_prev] = codes[has_prev] != codes[prev_valid[has_prev]]
+    changed_cum = np.cumsum(changed)
+    
+    # Only changes after the first known room inside the window count
+    next_valid = np.minimum.accumulate(np.where(valid, pos, n)[::-1])[::-1]
+    first = next_valid[starts]
+    counts = np.zeros(len(starts), dtype=int)
+    inside = first <= ends
+    counts[inside] = changed_cum[ends[inside]] - changed_cum[first[inside]]
+    return counts
+
+
+def make_window_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extract features for every sliding window in one vectorized pass.
+    Windows are WINDOW_MIN rows long and advance by HOP_MIN rows; each output
+    row describes the window ending at its "ts".
+    """
+    n_rows = len(df)
+    if n_rows < Config.WINDOW_MIN:
+        return pd.DataFrame()
     
-    # Oven features
-    oven_on_min = int((win["oven_power_w"] > Config.OVEN_W_THR).sum())
-    feat["oven_on_time_min"] = float(oven_on_min)
-    feat["oven_on_frac"] = oven_on_min / Config.WINDOW_MIN
+    ends = np.arange(Config.WINDOW_MIN - 1, n_rows, Config.HOP_MIN)
+    starts = ends - (Config.WINDOW_MIN - 1)
     
-    # Room transitions
-    feat["room_transitions"] = count_room_transitions(win)
+    # (n_windows, n_cols, WINDOW_MIN) strided views - no per-window copies
+    motion = df[Config.MOTION_COLS].fillna(0).to_numpy()
+    motion_win = sliding_window_view(motion, Config.WINDOW_MIN, axis=0)[::Config.HOP_MIN]
+    oven_on = df["oven_power_w"].to_numpy() > Config.OVEN_W_THR
+    oven_win = sliding_window_view(oven_on, Config.WINDOW_MIN)[::Config.HOP_MIN]
     
-    # Temporal features
-    last_ts = win.index[-1]
-    h = last_ts.hour
-    feat["hour"] = h
-    feat["is_quiet"] = is_quiet_hour(h)
+    ts = df.index[ends]
+    h = ts.hour.to_numpy()
     
-    # Derived features
-    feat["motion_sum_sqrt"] = math.sqrt(feat["motion_sum"])
-    feat["sin_hour"] = math.sin(2 * math.pi * h / 24.0)
-    feat["cos_hour"] = math.cos(2 * math.pi * h / 24.0)
+    # Motion features
+    motion_per_room = motion_win.sum(axis=2)
+    motion_sum = motion_per_room.sum(axis=1).astype(float)
     
-    return feat
+    # Oven features
+    oven_on_min = oven_win.sum(axis=1)
+    
+    # Columns are built as arrays and handed to a single DataFrame constructor
+    return pd.DataFrame({
+        "motion_sum": motion_sum,
+        "unique_rooms": (motion_per_room > 0).sum(axis=1).astype(int),
+        "oven_on_time_min": oven_on_min.astype(float),
+        "oven_on_frac": oven_on_min / Config.WINDOW_MIN,
+        "room_transitions": room_transitions_per_window(df["current_room"], starts, ends),
+        # Temporal features
+        "hour": h,
+        "is_quiet": QUIET_LUT[h].astype(int),
+        # Derived features
+        "motion_sum_sqrt": np.sqrt(motion_sum),
+        "sin_hour": HOUR_SIN[h],
+        "cos_hour": HOUR_COS[h],
+        "ts": ts,
+    })
 
 
-def is_candidate_anomaly(row: pd.Series) -> bool:
+def compute_candidate_mask(X: pd.DataFrame) -> np.ndarray:
     """
-    Determine if a window is a candidate anomaly.
+    Determine which windows are candidate anomalies.
     Includes suppression rules for pressure-only quiet hours.
     """
-    h = row["ts"].hour
-    adj_thr = row["threshold"] * (Config.QUIET_THRESHOLD_FACTOR if row["is_quiet"] == 1 else 1.0)
+    is_quiet = X["is_quiet"].to_numpy() == 1
+    unique_rooms = X["unique_rooms"].to_numpy()
+    transitions = X["room_transitions"].to_numpy()
+    oven_off = X["oven_on_frac"].to_numpy() == 0
+    motion_sum = X["motion_sum"].to_numpy()
+    
+    adj_thr = X["threshold"].to_numpy() * np.where(is_quiet, Config.QUIET_THRESHOLD_FACTOR, 1.0)
     
     # Pressure-only quiet-hour suppression
-    if (row["is_quiet"] == 1
-        and row["unique_rooms"] == 1
-        and row["room_transitions"] == 0
-        and row["oven_on_frac"] == 0
-        and row["motion_sum"] <= Config.QUIET_LOW_MOTION_MAX):
-        return False
+    suppressed = (is_quiet
+                  & (unique_rooms == 1)
+                  & (transitions == 0)
+                  & oven_off
+                  & (motion_sum <= Config.QUIET_LOW_MOTION_MAX))
     
     # Activity requirements
-    pressure_only = (row["unique_rooms"] == 1 and row["oven_on_frac"] == 0)
+    pressure_only = (unique_rooms == 1) & oven_off
     hard_activity = (
-        (row["is_quiet"] == 1 and row["room_transitions"] >= Config.QUIET_TRANSITIONS_ANOMALY) or
-        (row["motion_sum"] > Config.HIGH_MOTION_THRESHOLD) or
-        (pressure_only and row["motion_sum"] >= Config.PRESSURE_ONLY_MOTION_MIN)
+        (is_quiet & (transitions >= Config.QUIET_TRANSITIONS_ANOMALY)) |
+        (motion_sum > Config.HIGH_MOTION_THRESHOLD) |
+        (pressure_only & (motion_sum >= Config.PRESSURE_ONLY_MOTION_MIN))
     )
     
-    return (row["anomaly_score"] >= adj_thr) and hard_activity
+    return ~suppressed & (X["anomaly_score"].to_numpy() >= adj_thr) & hard_activity
+
+
+def robust_z_scores(X: pd.DataFrame, cols: List[str] = Config.ROBUST_Z_COLS) -> np.ndarray:
+    """
+    Score windows by the norm of their per-hour robust z-scores.
+    Linear-time alternative to Isolation Forest; MAD of 0 is treated as 1.
+    """
+    values = X[cols].astype(float)
+    hours = X["hour"]
+    dev = values - values.groupby(hours).transform("median")
+    mad = dev.abs().groupby(hours).transform("median")
+    z = dev / mad.where(mad > 0, 1.0)
+    return np.linalg.norm(z.to_numpy(), axis=1)
 
 
 # ============================================================================
 # GUARD DETECTORS
 # ============================================================================
-def oven_left_on_guard(p_series: pd.Series) -> List[Dict]:
+def oven_left_on_guard(p: np.ndarray, index: pd.DatetimeIndex) -> List[Dict]:
     """
     Detect oven left on with hysteresis.
+    Takes the power samples as a flat array plus their timestamps.
     Returns list of alert dictionaries.
     """
+    on_idx = np.flatnonzero(p > Config.OVEN_W_THR)
+    if len(on_idx) < Config.OVEN_MIN_THR:
+        return []
+    
+    # An on-episode ends once OVEN_OFF_MIN samples below the hysteresis level
+    # separate two consecutive on-samples
+    low_count = np.cumsum(p < Config.OVEN_OFF_HYST)
+    new_episode = np.ones(len(on_idx), dtype=bool)
+    new_episode[1:] = (low_count[on_idx[1:]] - low_count[on_idx[:-1]]) >= Config.OVEN_OFF_MIN
+    
+    ep_first = np.flatnonzero(new_episode)
+    ep_len = np.diff(np.append(ep_first, len(on_idx)))
+    
     alerts = []
-    streak = 0
-    off_streak = 0
-    on_start = None
-    
-    for t, w in p_series.items():
-        if w > Config.OVEN_W_THR:
-            if streak == 0:
-                on_start = t
-            streak += 1
-            
-            if streak == Config.OVEN_MIN_THR:
-                alerts.append({
-                    "ts_start": on_start,
-                    "ts_end": t,
-                    "type": "guard",
-                    "label": "oven_left_on",
-                    "score": None,
-                    "features": {"power_w": int(w), "minutes_on": int(streak)},
-                    "explanations": [f"Oven power > {Config.OVEN_W_THR}W for ≥{Config.OVEN_MIN_THR} min"]
-                })
-            
-            off_streak = 0
-        else:
-            if w < Config.OVEN_OFF_HYST:
-                off_streak += 1
-            
-            if off_streak >= Config.OVEN_OFF_MIN:
-                streak = 0
-                off_streak = 0
-                on_start = None
+    for k in ep_first[ep_len >= Config.OVEN_MIN_THR]:
+        end = on_idx[k + Config.OVEN_MIN_THR - 1]
+        alerts.append({
+            "ts_start": index[on_idx[k]],
+            "ts_end": index[end],
+            "type": "guard",
+            "label": "oven_left_on",
+            "score": None,
+            "features": {"power_w": int(p[end]), "minutes_on": int(Config.OVEN_MIN_THR)},
+            "explanations": [EXPLANATIONS["oven_left_on"]]
+        })
     
     return alerts
 
@@ -246,26 +387,22 @@ def sleep_sessions_from_bed(df_minutes: pd.DataFrame) -> List[Dict]:
     Detect sleep sessions and possible immobility from bedroom pressure.
     Works across day boundaries by checking quiet hours per timestamp.
     """
-    pressed = (df_minutes["bedroom_motion"] >= Config.SLEEP_MIN_PRESS).astype(int)
+    if len(df_minutes) == 0:
+        return []
     
-    sessions = []
-    in_sess = False
-    s_start = None
-    alerts_local = []
+    in_bed = ((df_minutes["bedroom_motion"].to_numpy() >= Config.SLEEP_MIN_PRESS)
+              & (QUIET_LUT[df_minutes.index.hour] == 1))
     
-    # Build sessions
-    for t, v in pressed.items():
-        if v == 1 and is_quiet_hour(t.hour):
-            if not in_sess:
-                in_sess = True
-                s_start = t
-        else:
-            if in_sess:
-                sessions.append((s_start, t))
-                in_sess = False
+    alerts_local = []
     
-    if in_sess and s_start is not None:
-        sessions.append((s_start, pressed.index[-1] + pd.Timedelta(minutes=1)))
+    # Build sessions from rising/falling edges of the in-bed mask; a session
+    # still open at the end closes one minute after the last sample
+    edges = np.diff(in_bed.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    idx = df_minutes.index
+    end_ts = idx.append(pd.DatetimeIndex([idx[-1] + pd.Timedelta(minutes=1)]))
+    sessions = list(zip(idx[starts], end_ts[ends]))
     
     # Analyze each session
     for (s, e) in sessions:
@@ -273,13 +410,11 @@ def sleep_sessions_from_bed(df_minutes: pd.DataFrame) -> List[Dict]:
         if dur_min < Config.SLEEP_MIN_SESSION_MIN:
             continue
         
-        # Get segment data
-        seg_idx = pd.date_range(s, e - pd.Timedelta(minutes=1), freq="1min")
-        seg_idx = seg_idx.intersection(df_minutes.index)
-        if len(seg_idx) == 0:
+        # Get segment data (binary-search slice on the sorted index)
+        seg = df_minutes["bedroom_motion"].loc[s:e - pd.Timedelta(minutes=1)]
+        if len(seg) == 0:
             continue
         
-        seg = df_minutes.loc[seg_idx, "bedroom_motion"]
         turnover_minutes = seg[seg >= Config.SLEEP_TURNOVER_THRESHOLD].index.tolist()
         turnovers = len(turnover_minutes)
         
@@ -321,9 +456,7 @@ def sleep_sessions_from_bed(df_minutes: pd.DataFrame) -> List[Dict]:
                         "max_gap_min": int(max_gap),
                         "threshold_min": int(Config.SLEEP_IMMOBILITY_GAP_MIN)
                     },
-                    "explanations": [
-                        f"No turnover ≥{Config.SLEEP_TURNOVER_THRESHOLD} for ≥{Config.SLEEP_IMMOBILITY_GAP_MIN} min during sleep"
-                    ]
+                    "explanations": [EXPLANATIONS["possible_immobility"]]
                 })
     
     return alerts_local
@@ -332,32 +465,29 @@ def sleep_sessions_from_bed(df_minutes: pd.DataFrame) -> List[Dict]:
 # ============================================================================
 # ANOMALY INCIDENT GROUPING
 # ============================================================================
+INCIDENT_COLS = ["ts", "anomaly_score", "motion_sum", "unique_rooms",
+                 "room_transitions", "oven_on_frac", "is_quiet"]
+
+
 def group_anomaly_incidents(df_anom: pd.DataFrame) -> List[Dict]:
     """Group anomaly windows into incidents with temporal proximity."""
-    incidents = []
-    cur = []
+    if df_anom.empty:
+        return []
     
-    for _, row in df_anom.iterrows():
-        if not cur:
-            cur = [row]
-            continue
-        
-        gap = (row["ts"] - cur[-1]["ts"]).total_seconds() / 60.0
-        if gap <= Config.MIN_ALERT_GAP_MIN:
-            cur.append(row)
-        else:
-            incidents.append(cur)
-            cur = [row]
+    # A new incident starts wherever the gap to the previous window is too large;
+    # incidents are then runs [first, last) of positions in the sorted candidates
+    ts = pd.DatetimeIndex(df_anom["ts"])
+    gap_min = np.diff(ts.to_numpy()) / np.timedelta64(1, "m")
+    breaks = np.flatnonzero(gap_min > Config.MIN_ALERT_GAP_MIN) + 1
+    first = np.concatenate(([0], breaks))
+    last = np.append(breaks, len(df_anom))
     
-    if cur:
-        incidents.append(cur)
+    scores = df_anom["anomaly_score"].to_numpy()
+    peak_pos = [s + int(np.argmax(scores[s:e])) for s, e in zip(first, last)]
+    peaks = df_anom.iloc[peak_pos].to_dict("records")
     
     out = []
-    for inc in incidents:
-        start = inc[0]["ts"]
-        end = inc[-1]["ts"]
-        peak = max(inc, key=lambda r: r["anomaly_score"])
-        
+    for start, end, peak in zip(ts[first], ts[last - 1], peaks):
         label = ("night_wandering" 
                  if peak["is_quiet"] == 1 and peak["room_transitions"] >= Config.QUIET_TRANSITIONS_ANOMALY 
                  else "unusual_activity")
@@ -376,14 +506,22 @@ def group_anomaly_incidents(df_anom: pd.DataFrame) -> List[Dict]:
                 "is_quiet": int(peak["is_quiet"])
             },
             "explanations": [
-                "High motion during quiet hours" if peak["is_quiet"] == 1 else "Unusual activity vs routine",
-                "Frequent room transitions" if peak["room_transitions"] >= Config.QUIET_TRANSITIONS_ANOMALY else "Activity spike"
+                EXPLANATIONS["quiet_motion"] if peak["is_quiet"] == 1 else EXPLANATIONS["unusual_activity"],
+                (EXPLANATIONS["frequent_transitions"]
+                 if peak["room_transitions"] >= Config.QUIET_TRANSITIONS_ANOMALY
+                 else EXPLANATIONS["activity_spike"])
             ]
         })
     
     return out
 
 
+def bulk_uuid4(n: int) -> List[str]:
+    """Generate n random (version 4) UUID strings from a single urandom read."""
+    blob = os.urandom(16 * n)
+    return [str(uuid.UUID(bytes=blob[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
+
 # ============================================================================
 # MAIN PIPELINE
 # ============================================================================
@@ -407,88 +545,97 @@ def run_pipeline_from_df(df_input: pd.DataFrame,
     
     # Validate input
     validate_input_dataframe(df_input)
-    df_local = df_input.copy()
+    # Sorted copy: windowing and session slicing rely on a monotonic index
+    df_local = df_input.sort_index()
+    
+    # Store motion counts in the smallest integer dtype that holds them
+    # (int8 for typical data) so window sums stream fewer bytes
+    for col in Config.MOTION_COLS:
+        df_local[col] = pd.to_numeric(df_local[col], downcast="integer")
     
     # ========== 1. Presence Detection ==========
-    for room in Config.ROOMS:
-        if f"{room}_present_raw" not in df_local.columns:
-            df_local[f"{room}_present_raw"] = (df_local[f"{room}_motion"] > 0).astype(int)
+    missing = [room for room in Config.ROOMS if f"{room}_present_raw" not in df_local.columns]
+    if missing:
+        raw = df_local[[f"{room}_motion" for room in missing]].to_numpy() > 0
+        for j, room in enumerate(missing):
+            df_local[f"{room}_present_raw"] = raw[:, j].astype(int)
     
-    for room in Config.ROOMS:
-        df_local[f"{room}_present"] = debounce_series(df_local[f"{room}_present_raw"])
+    present = debounce_frame(df_local, [f"{room}_present_raw" for room in Config.ROOMS])
+    for j, room in enumerate(Config.ROOMS):
+        df_local[f"{room}_present"] = present[j].astype(int)
     
     # ========== 2. Current Room Trace ==========
-    current_rooms = []
-    prev_r = None
-    for _, row in df_local.iterrows():
-        cr = infer_current_room(row, prev_r)
-        current_rooms.append(cr)
-        prev_r = cr
-    df_local["current_room"] = current_rooms
+    # Reuse the debounced presence matrix rather than re-reading the columns
+    df_local["current_room"] = infer_current_rooms(df_local, present=present)
     
     # ========== 3. Windowing + Features ==========
-    windows = []
-    feature_rows = []
-    
-    for end_idx in range(Config.WINDOW_MIN - 1, len(df_local), Config.HOP_MIN):
-        win = df_local.iloc[end_idx - (Config.WINDOW_MIN - 1): end_idx + 1]
-        if len(win) == Config.WINDOW_MIN:
-            windows.append(df_local.index[end_idx])
-            feature_rows.append(make_features(win))
+    X = make_window_features(df_local)
     
-    if len(windows) == 0:
+    if len(X) == 0:
         logger.warning("No complete windows found")
         return []
     
-    X = pd.DataFrame(feature_rows)
-    X["ts"] = windows
-    
-    # ========== 4. Isolation Forest Training ==========
-    model_cols = ["motion_sum_sqrt", "unique_rooms", "oven_on_frac", 
-                  "room_transitions", "sin_hour", "cos_hour", "is_quiet"]
-    
-    train_idx = [i for i, w in enumerate(windows) if w.hour < 12]
-    if len(train_idx) < 10:
-        logger.warning("Insufficient training data (< 10 windows)")
-        train_idx = list(range(min(len(windows), 50)))
-    
-    X_train = X.iloc[train_idx]
-    
-    scaler = StandardScaler().fit(X_train[model_cols])
-    X_scaled = scaler.transform(X[model_cols])
-    
-    if_model = IsolationForest(
-        n_estimators=200,
-        contamination="auto",
-        random_state=Config.RNG_SEED
-    ).fit(scaler.transform(X_train[model_cols]))
-    
-    dec = if_model.decision_function(X_scaled)
-    X["anomaly_score"] = -dec
+    # ========== 4. Anomaly Scoring ==========
+    if Config.ANOMALY_SCORER == "robust_z":
+        X["anomaly_score"] = robust_z_scores(X)
+    else:
+        model_cols = ["motion_sum_sqrt", "unique_rooms", "oven_on_frac", 
+                      "room_transitions", "sin_hour", "cos_hour", "is_quiet"]
+        
+        train_idx = np.flatnonzero(X["hour"].to_numpy() < 12)
+        if len(train_idx) < 10:
+            logger.warning("Insufficient training data (< 10 windows)")
+            train_idx = np.arange(min(len(X), 50))
+        
+        # Scale every window once; the training rows are a slice of that
+        features = X[model_cols].to_numpy(dtype=float)
+        scaler = StandardScaler().fit(features[train_idx])
+        # Trees work in float32 internally: hand them contiguous float32
+        # arrays up front so fit/score skip their own conversion copies
+        X_scaled = np.ascontiguousarray(scaler.transform(features), dtype=np.float32)
+        X_train_scaled = X_scaled[train_idx]
+        
+        if_model = IsolationForest(
+            n_estimators=200,
+            contamination="auto",
+            n_jobs=Config.IF_N_JOBS,
+            random_state=Config.RNG_SEED
+        ).fit(X_train_scaled)
+        
+        dec = if_model.decision_function(X_scaled)
+        X["anomaly_score"] = -dec
     
     # ========== 5. Adaptive Thresholds ==========
-    thr_by_hour = (X.groupby(X["ts"].dt.hour)["anomaly_score"]
-                   .quantile(Config.ANOM_PCTL_PER_HOUR / 100.0)
-                   .to_dict())
-    
-    global_thr = np.quantile(X["anomaly_score"], Config.ANOM_PCTL_PER_HOUR / 100.0)
-    X["threshold"] = X["ts"].dt.hour.map(lambda h: thr_by_hour.get(h, global_thr))
+    q = Config.ANOM_PCTL_PER_HOUR / 100.0
+    thr_by_hour = (X.groupby("hour")["anomaly_score"].quantile(q)
+                   .reindex(np.arange(24)).to_numpy())
+    threshold = thr_by_hour[X["hour"].to_numpy()]
+    
+    # Every window's hour has its own quantile, so the global fallback is
+    # only computed if a per-hour value came out missing
+    missing = np.isnan(threshold)
+    if missing.any():
+        threshold[missing] = np.nanquantile(X["anomaly_score"], q)
+    X["threshold"] = threshold
     
     # ========== 6. Candidate Detection ==========
-    X["is_candidate"] = X.apply(is_candidate_anomaly, axis=1)
+    X["is_candidate"] = compute_candidate_mask(X)
     
     # ========== 7. Guards ==========
-    guard_alerts = oven_left_on_guard(df_local["oven_power_w"])
+    guard_alerts = oven_left_on_guard(df_local["oven_power_w"].to_numpy(dtype=float), df_local.index)
     sleep_alerts = sleep_sessions_from_bed(df_local)
     
     # ========== 8. Anomaly Incident Grouping ==========
-    cand = X[X["is_candidate"]].copy()
+    # Boolean .loc already returns a new frame; take only the columns grouping reads
+    cand = X.loc[X["is_candidate"].to_numpy(), INCIDENT_COLS]
     anomaly_incidents = group_anomaly_incidents(cand)
     
     # ========== 9. Normalize Alerts ==========
-    def normalize_alert(a: Dict) -> Dict:
+    quiet_hours = f"{Config.QUIET_START:02d}:00-{Config.QUIET_END:02d}:00"
+    
+    def normalize_alert(a: Dict, alert_id: str) -> Dict:
         return {
-            "id": str(uuid.uuid4()),
+            "id": alert_id,
             "ts_start": a["ts_start"].isoformat(),
             "ts_end": a["ts_end"].isoformat(),
             "type": a["type"],
@@ -499,24 +646,28 @@ def run_pipeline_from_df(df_input: pd.DataFrame,
             "snoozed_until": None,
             "ack_status": "new",
             "household_id": household_id,
-            "policy_context": {
-                "quiet_hours": f"{Config.QUIET_START:02d}:00-{Config.QUIET_END:02d}:00"
-            }
+            "policy_context": {"quiet_hours": quiet_hours}
         }
     
-    alerts = [normalize_alert(a) for a in (guard_alerts + anomaly_incidents + sleep_alerts)]
+    raw_alerts = guard_alerts + anomaly_incidents + sleep_alerts
+    alerts = [normalize_alert(a, alert_id) for a, alert_id in zip(raw_alerts, bulk_uuid4(len(raw_alerts)))]
     
+    type_counts = Counter(a["type"] for a in alerts)
     logger.info(f"Generated {len(alerts)} alerts: "
-                f"{sum(1 for a in alerts if a['type']=='guard')} guards, "
-                f"{sum(1 for a in alerts if a['type']=='anomaly')} anomalies, "
-                f"{sum(1 for a in alerts if a['type']=='info')} info")
+                f"{type_counts['guard']} guards, "
+                f"{type_counts['anomaly']} anomalies, "
+                f"{type_counts['info']} info")
     
     # ========== 10. Save Output ==========
     if save_output:
         from datetime import date
         out_path = f"alerts_{date.today().isoformat()}_{tag}.json"
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump({"alerts": alerts}, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(out_path, "wb") as f:
+                f.write(orjson.dumps({"alerts": alerts}, option=orjson.OPT_INDENT_2))
+        else:
+            with open(out_path, "w", encoding="utf-8") as f:
+                json.dump({"alerts": alerts}, f, ensure_ascii=False, indent=2)
         logger.info(f"Saved {out_path}")
     
     return alerts
@@ -533,39 +684,34 @@ def generate_demo_data() -> pd.DataFrame:
     
     rng = np.random.default_rng(Config.RNG_SEED)
     
-    def day_night_rate(hour):
-        return 2.5 if 8 <= hour < 22 else 0.3
+    # Per-minute Poisson rates, drawn for the whole day in one call per channel
+    hours = ts.hour.to_numpy()
+    day_night_rate = np.where((hours >= 8) & (hours < 22), 2.5, 0.3)
+    bedroom_rate = np.where(QUIET_LUT[hours] == 1, 0.6, 0.1)
     
+    # Compact typed columns: small counts fit int16, watts fit int32
     data = {
-        "hall_motion": [],
-        "kitchen_motion": [],
-        "bedroom_motion": [],
-        "oven_power_w": []
+        "hall_motion": rng.poisson(day_night_rate).astype(np.int16),
+        "kitchen_motion": rng.poisson(day_night_rate * 0.8).astype(np.int16),
+        "bedroom_motion": rng.poisson(bedroom_rate).astype(np.int16),
+        "oven_power_w": np.zeros(minutes, dtype=np.int32)
     }
     
-    for t in ts:
-        r = day_night_rate(t.hour)
-        data["hall_motion"].append(rng.poisson(r))
-        data["kitchen_motion"].append(rng.poisson(r * 0.8))
-        data["bedroom_motion"].append(rng.poisson(0.6 if is_quiet_hour(t.hour) else 0.1))
-        data["oven_power_w"].append(0)
-    
-    df = pd.DataFrame(data, index=ts)
+    df = pd.DataFrame(data, index=ts, copy=False)
     
     # Normal lunch cooking
     df.loc[(df.index.hour == 13) & (df.index.minute < 25), "oven_power_w"] = 850
     
     # Inject night wandering at 2 AM
     mask_wander_motion = (df.index.hour == 2) & (df.index.minute < 25)
-    df.loc[mask_wander_motion, ["hall_motion", "kitchen_motion"]] += rng.poisson(3.5, size=(mask_wander_motion.sum(), 2))
+    df.loc[mask_wander_motion, ["hall_motion", "kitchen_motion"]] += rng.poisson(3.5, size=(mask_wander_motion.sum(), 2)).astype(np.int16)
     
     # Create room transitions
-    block_times = df[mask_wander_motion].index
-    for i, t in enumerate(block_times):
-        if i % 4 < 2:
-            df.loc[t, "hall_motion"] += 2
-        else:
-            df.loc[t, "kitchen_motion"] += 2
+    # (alternate two minutes in the hall, two in the kitchen)
+    block_times = df.index[mask_wander_motion]
+    in_hall = np.arange(len(block_times)) % 4 < 2
+    df.loc[block_times[in_hall], "hall_motion"] += 2
+    df.loc[block_times[~in_hall], "kitchen_motion"] += 2
     
     # Inject oven left on at 11 PM
     mask_oven = (df.index.hour == 23)
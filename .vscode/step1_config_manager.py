@@ -3,14 +3,21 @@ Step 1: Core Data Structures and Configuration Manager
 Test this first to ensure basic functionality works
 """
 
+import atexit
 import json
 import logging
 import os
+import threading
 from datetime import datetime
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, asdict
 from enum import Enum
 
+try:
+    import orjson
+except ImportError:  # optional: fall back to stdlib json
+    orjson = None
+
 # ======================== Setup Logging ========================
 logging.basicConfig(
     level=logging.INFO,
@@ -54,8 +61,13 @@ class ConfigManager:
     def __init__(self, config_file="config.json", state_file="system_state.json"):
         self.config_file = config_file
         self.state_file = state_file
+        self._dirty = False
+        self._flush_timer = None
+        self._state_lock = threading.Lock()
+        self.flush_delay = 0.5
         self.config = self.load_config()
         self.state = self.load_state()
+        atexit.register(self.flush)
         
     def load_config(self) -> Dict:
         """Load user configuration from config.json"""
@@ -143,17 +155,41 @@ class ConfigManager:
         if state:
             self.state = state
         try:
-            with open(self.state_file, 'w') as f:
-                json.dump(self.state, f, indent=2)
+            # Write to a temp file and swap it in so a crash never leaves
+            # a truncated state file behind
+            tmp_file = self.state_file + '.tmp'
+            if orjson is not None:
+                with open(tmp_file, 'wb') as f:
+                    f.write(orjson.dumps(self.state, option=orjson.OPT_INDENT_2))
+            else:
+                with open(tmp_file, 'w') as f:
+                    json.dump(self.state, f, indent=2)
+            os.replace(tmp_file, self.state_file)
             logger.debug("💾 State saved successfully")
         except Exception as e:
             logger.error(f"❌ Error saving state: {e}")
     
     def update_state(self, **kwargs):
-        """Update specific state fields"""
-        self.state.update(kwargs)
-        self.save_state()
+        """Update specific state fields; the disk write is coalesced"""
+        with self._state_lock:
+            self.state.update(kwargs)
+            self._dirty = True
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
         logger.info(f"📝 State updated: {kwargs}")
+    
+    def flush(self):
+        """Write pending state updates to disk, if any"""
+        with self._state_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            self.save_state()
 
 # ======================== Test Functions ========================
 def test_config_manager():
@@ -4,14 +4,24 @@ This simulates MQTT messages without needing a real broker
 Perfect for VS Code development
 """
 
+import bisect
 import json
 import random
+import re
 import threading
 import time
 import queue
-from datetime import datetime, timedelta
+import numpy as np
+from collections import namedtuple
+from datetime import datetime
 from typing import Dict, List, Callable
 
+# Simulated MQTT message object (callbacks only read .topic and .payload)
+MockMessage = namedtuple('MockMessage', ['topic', 'payload'])
+
+POWER_DEVICES = ('oven', 'tv', 'washer')
+POWER_LOCATIONS = ('kitchen', 'living_room', 'utility')
+
 class MQTTSimulator:
     """Simulates MQTT broker and sensors for testing without real hardware"""
     
@@ -19,19 +29,22 @@ class MQTTSimulator:
         self.running = False
         self.message_queue = queue.Queue()
         self.subscribers = {}
+        self.patterns = {}  # topic pattern -> compiled regex
         self.thread = None
+        self._rng = np.random.default_rng()
         
     def subscribe(self, topic: str, callback: Callable):
         """Register a callback for a topic pattern"""
         self.subscribers[topic] = callback
+        self.patterns[topic] = self._compile_pattern(topic)
         print(f"📡 Subscribed to: {topic}")
     
-    def publish(self, topic: str, payload: Dict):
-        """Publish a message to a topic"""
+    def publish(self, topic: str, payload: Dict, timestamp: str = None):
+        """Publish a message to a topic (timestamp defaults to now)"""
         message = {
             'topic': topic,
             'payload': json.dumps(payload),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp or datetime.now().isoformat()
         }
         self.message_queue.put(message)
     
@@ -64,91 +77,102 @@ class MQTTSimulator:
     
     def _generate_sensor_data(self):
         """Generate realistic sensor data"""
+        # One clock read per tick: every message in it shares the timestamp
+        now = datetime.now()
+        tick_ts = now.isoformat()
+        
         # Current hour for time-based patterns
-        current_hour = datetime.now().hour
+        current_hour = now.hour
+        daytime = 7 <= current_hour <= 22
+        
+        # Draw every random value this tick needs in one go
+        rng = self._rng
+        p = rng.random(4)       # per-sensor publish gates
+        u = rng.random(4)       # motion/confidence/door/power uniforms
+        temp_noise = rng.normal(0, 1.5)
+        temp_room, temp_loc = rng.integers(1, 4, size=2)
+        power_dev, power_loc = rng.integers(0, 3, size=2)
         
         # Motion sensor
-        if random.random() < 0.3:  # 30% chance
-            motion_active = True if 7 <= current_hour <= 22 else (random.random() < 0.1)
+        if p[0] < 0.3:  # 30% chance
+            motion_active = True if daytime else bool(u[0] < 0.1)
             self.publish(
                 "sensors/motion/living_room",
                 {
                     "value": motion_active,
                     "location": "living_room",
-                    "confidence": random.uniform(0.8, 1.0)
-                }
+                    "confidence": 0.8 + 0.2 * float(u[1])
+                },
+                tick_ts
             )
         
         # Temperature sensor
-        if random.random() < 0.5:  # 50% chance
-            base_temp = 21 if 7 <= current_hour <= 22 else 19
-            temp = base_temp + random.gauss(0, 1.5)
+        if p[1] < 0.5:  # 50% chance
+            base_temp = 21 if daytime else 19
+            temp = base_temp + float(temp_noise)
             self.publish(
-                f"sensors/temperature/room_{random.randint(1,3)}",
+                f"sensors/temperature/room_{temp_room}",
                 {
                     "value": round(temp, 1),
                     "unit": "celsius",
-                    "location": f"room_{random.randint(1,3)}"
-                }
+                    "location": f"room_{temp_loc}"
+                },
+                tick_ts
             )
         
         # Door sensor
-        if random.random() < 0.1:  # 10% chance
+        if p[2] < 0.1:  # 10% chance
             self.publish(
                 "sensors/door/front",
                 {
-                    "value": random.choice(["open", "closed"]),
+                    "value": "open" if u[2] < 0.5 else "closed",
                     "location": "front_door"
-                }
+                },
+                tick_ts
             )
         
         # Power sensor
-        if random.random() < 0.2:  # 20% chance
-            power = random.uniform(100, 2000) if 7 <= current_hour <= 22 else random.uniform(10, 100)
+        if p[3] < 0.2:  # 20% chance
+            power = 100 + 1900 * float(u[3]) if daytime else 10 + 90 * float(u[3])
             self.publish(
-                f"sensors/power/{random.choice(['oven', 'tv', 'washer'])}",
+                f"sensors/power/{POWER_DEVICES[power_dev]}",
                 {
                     "value": round(power, 1),
                     "unit": "watts",
-                    "location": random.choice(['kitchen', 'living_room', 'utility'])
-                }
+                    "location": POWER_LOCATIONS[power_loc]
+                },
+                tick_ts
             )
     
     def _process_messages(self):
         """Process queued messages and call subscribers"""
-        while not self.message_queue.empty():
-            try:
-                message = self.message_queue.get_nowait()
-                topic = message['topic']
-                
-                # Find matching subscribers (simple pattern matching)
-                for pattern, callback in self.subscribers.items():
-                    if self._topic_matches(pattern, topic):
-                        # Simulate MQTT message object
-                        class MockMessage:
-                            def __init__(self, topic, payload):
-                                self.topic = topic
-                                self.payload = payload.encode() if isinstance(payload, str) else payload
-                        
-                        mock_msg = MockMessage(topic, message['payload'])
-                        callback(None, None, mock_msg)
-                        
-            except queue.Empty:
-                break
+        # Take everything queued so far under one lock acquisition
+        with self.message_queue.mutex:
+            batch = list(self.message_queue.queue)
+            self.message_queue.queue.clear()
+        
+        for message in batch:
+            topic = message['topic']
+            payload = message['payload']
+            mock_msg = MockMessage(topic, payload.encode() if isinstance(payload, str) else payload)
+            
+            # Find matching subscribers (simple pattern matching)
+            for pattern, callback in self.subscribers.items():
+                if self._topic_matches(pattern, topic):
+                    callback(None, None, mock_msg)
     
     def _topic_matches(self, pattern: str, topic: str) -> bool:
         """Check if topic matches pattern (supports + wildcard)"""
-        pattern_parts = pattern.split('/')
-        topic_parts = topic.split('/')
-        
-        if len(pattern_parts) != len(topic_parts):
-            return False
-        
-        for p, t in zip(pattern_parts, topic_parts):
-            if p != '+' and p != t:
-                return False
-        
-        return True
+        regex = self.patterns.get(pattern)
+        if regex is None:
+            regex = self.patterns[pattern] = self._compile_pattern(pattern)
+        return regex.match(topic) is not None
+    
+    @staticmethod
+    def _compile_pattern(pattern: str):
+        """Compile a topic pattern once; '+' matches exactly one level"""
+        levels = ('[^/]*' if p == '+' else re.escape(p) for p in pattern.split('/'))
+        return re.compile('/'.join(levels) + r'\Z')
 
 class LocalDataCollector:
     """Collects data from the MQTT simulator for testing"""
@@ -157,6 +181,7 @@ class LocalDataCollector:
         self.data_queue = queue.Queue()
         self.simulator = MQTTSimulator()
         self.collected_data = []
+        self.collected_epochs = []  # arrival time of each collected_data entry
         
     def on_message(self, client, userdata, msg):
         """Callback for incoming messages"""
@@ -182,6 +207,7 @@ class LocalDataCollector:
             # Add to queue and collected data
             self.data_queue.put(sensor_data)
             self.collected_data.append(sensor_data)
+            self.collected_epochs.append(time.time())
             
             # Log it
             print(f"📊 {sensor_type}/{sensor_id}: {payload.get('value')} @ {payload.get('location', 'unknown')}")
@@ -208,12 +234,10 @@ class LocalDataCollector:
     
     def get_recent_data(self, seconds: int = 60) -> List[Dict]:
         """Get data from the last N seconds"""
-        cutoff = datetime.now() - timedelta(seconds=seconds)
-        recent = [
-            d for d in self.collected_data
-            if datetime.fromisoformat(d['timestamp']) > cutoff
-        ]
-        return recent
+        # Entries are appended in arrival order, so the cutoff is a binary search
+        cutoff = time.time() - seconds
+        start = bisect.bisect_right(self.collected_epochs, cutoff)
+        return self.collected_data[start:]
 
 # ======================== Test Functions ========================
 def test_mqtt_simulator():
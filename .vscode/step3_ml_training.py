@@ -4,8 +4,8 @@ This implements the ML components using simulated data
 """
 
 import json
+import math
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 import os
@@ -15,10 +15,249 @@ from sklearn.preprocessing import StandardScaler
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import orjson  # optional: faster decoding of JSON sensor payloads
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; kernels run as plain Python without it
+    def njit(*args, **kwargs):
+        def decorator(fn):
+            return fn
+        return decorator
+
 # Import our previous components
 import sys
 sys.path.append('.')  # Add current directory to path
 
+def _to_float(value) -> Optional[float]:
+    """Numeric value of a reading, or None if it has none (like pd.to_numeric coerce)"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_US = timedelta(microseconds=1)
+
+_US_PER_MINUTE = 60_000_000
+_US_PER_HOUR = 60 * _US_PER_MINUTE
+_US_PER_DAY = 24 * _US_PER_HOUR
+
+def _timestamp_us(timestamp: str) -> int:
+    """Wall-clock microseconds since 1970-01-01 of an ISO timestamp, as written"""
+    return (datetime.fromisoformat(timestamp).replace(tzinfo=None) - _EPOCH) // _ONE_US
+
+def _window_bounds(ts_us: np.ndarray, window_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start/end indices of 50%-overlapping windows over sorted timestamps:
+    window i covers [starts[i], ends[i]), every event within window_size
+    seconds of the event at starts[i].
+    """
+    starts = np.arange(0, ts_us.shape[0], max(1, window_size // 2))
+    ends = np.searchsorted(ts_us, ts_us[starts] + window_size * 1_000_000, side='right')
+    return starts, ends
+
+# Batches at least this large are scored with trees spread over threads
+# (sklearn measures sequential scoring as faster below ~1k rows)
+PARALLEL_SCORE_MIN_ROWS = 1000
+
+# Small integer codes for the sensor types the features look at (-1 = other)
+SENSOR_TYPE_CODES = {'motion': 0, 'temperature': 1, 'door': 2, 'power': 3}
+MOTION, TEMPERATURE, DOOR, POWER = 0, 1, 2, 3
+
+class SensorBuffer:
+    """
+    Sensor events as parallel NumPy arrays (structure of arrays) instead of a
+    list of dicts; storage doubles as it fills. Columns (trimmed views):
+      ts        - wall-clock microseconds since 1970-01-01 (int64)
+      stype     - SENSOR_TYPE_CODES code, -1 for other types (int8)
+      value_f   - numeric value of temperature/power readings, NaN if none
+      value_b   - motion active / door open flag (uint8)
+      sensor_id - sensor id interned to 0..k-1 in first-seen order, -1 if missing
+    """
+    COLUMNS = (('ts', np.int64), ('stype', np.int8), ('value_f', np.float64),
+               ('value_b', np.uint8), ('sensor_id', np.int32))
+    
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.sensor_ids = {}  # sensor id -> interned code
+        self._columns = {name: np.empty(max(capacity, 1), dtype=dtype) for name, dtype in self.COLUMNS}
+    
+    @classmethod
+    def from_events(cls, events: List[Dict]) -> 'SensorBuffer':
+        """Buffer holding the given events"""
+        buf = cls(len(events))
+        buf.append_many(events)
+        return buf
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    @property
+    def ts(self) -> np.ndarray:
+        return self._columns['ts'][:self.size]
+    
+    @property
+    def stype(self) -> np.ndarray:
+        return self._columns['stype'][:self.size]
+    
+    @property
+    def value_f(self) -> np.ndarray:
+        return self._columns['value_f'][:self.size]
+    
+    @property
+    def value_b(self) -> np.ndarray:
+        return self._columns['value_b'][:self.size]
+    
+    @property
+    def sensor_id(self) -> np.ndarray:
+        return self._columns['sensor_id'][:self.size]
+    
+    def _reserve(self, n: int):
+        """Grow storage (by doubling) to hold at least n events"""
+        capacity = self._columns['ts'].shape[0]
+        if n <= capacity:
+            return
+        while capacity < n:
+            capacity *= 2
+        for name, col in self._columns.items():
+            grown = np.empty(capacity, dtype=col.dtype)
+            grown[:self.size] = col[:self.size]
+            self._columns[name] = grown
+    
+    def push(self, event: Dict):
+        """Append a single event"""
+        self.append_many((event,))
+    
+    def append_many(self, events: List[Dict]):
+        """Decode events into the columns, parsing each timestamp and value once"""
+        n = len(events)
+        self._reserve(self.size + n)
+        ts, stype, value_f, value_b, sensor_id = [], [], [], [], []
+        sensor_ids = self.sensor_ids
+        
+        for ev in events:
+            ts.append(_timestamp_us(ev['timestamp']))
+            
+            sid = ev.get('sensor_id')
+            sensor_id.append(-1 if sid is None else sensor_ids.setdefault(sid, len(sensor_ids)))
+            
+            code = SENSOR_TYPE_CODES.get(ev.get('sensor_type'), -1)
+            stype.append(code)
+            value = ev.get('value')
+            if code == MOTION:
+                value_b.append(value == True)
+                value_f.append(np.nan)
+            elif code == DOOR:
+                value_b.append(value == 'open')
+                value_f.append(np.nan)
+            else:
+                value_b.append(False)
+                value = _to_float(value) if code != -1 else None
+                value_f.append(np.nan if value is None else value)
+        
+        rows = slice(self.size, self.size + n)
+        for name, values in (('ts', ts), ('stype', stype), ('value_f', value_f),
+                             ('value_b', value_b), ('sensor_id', sensor_id)):
+            self._columns[name][rows] = values
+        self.size += n
+    
+    def append_json(self, payload):
+        """Append events from a JSON payload (str/bytes): one event object or a list of them"""
+        events = orjson.loads(payload) if orjson is not None else json.loads(payload)
+        if isinstance(events, dict):
+            events = (events,)
+        self.append_many(events)
+    
+    def sort_by_time(self) -> np.ndarray:
+        """Stable-sort the events by timestamp in place; returns the applied order"""
+        order = np.argsort(self.ts, kind='stable')
+        for col in self._columns.values():
+            col[:self.size] = col[:self.size][order]
+        return order
+
+@njit(cache=True, boundscheck=False)
+def _aggregate_window(stype: np.ndarray, value_f: np.ndarray, value_b: np.ndarray,
+                      out: np.ndarray) -> None:
+    """Fill the sensor features (out[5:17]) of one window in a single fused pass."""
+    motion_events = 0
+    motion_count = 0
+    door_events = 0
+    door_open_count = 0
+    temp_n = 0
+    temp_mean = 0.0
+    temp_m2 = 0.0
+    temp_min = np.inf
+    temp_max = -np.inf
+    power_n = 0
+    power_sum = 0.0
+    power_max = -np.inf
+    
+    for i in range(stype.shape[0]):
+        code = stype[i]
+        if code == MOTION:
+            motion_events += 1
+            motion_count += value_b[i]
+        elif code == DOOR:
+            door_events += 1
+            door_open_count += value_b[i]
+        elif code == TEMPERATURE:
+            v = value_f[i]
+            if np.isnan(v):
+                continue
+            # Welford's running mean / sum of squared deviations
+            temp_n += 1
+            delta = v - temp_mean
+            temp_mean += delta / temp_n
+            temp_m2 += delta * (v - temp_mean)
+            temp_min = min(temp_min, v)
+            temp_max = max(temp_max, v)
+        elif code == POWER:
+            v = value_f[i]
+            if np.isnan(v):
+                continue
+            power_n += 1
+            power_sum += v
+            power_max = max(power_max, v)
+    
+    # Motion features
+    out[5] = motion_count
+    out[6] = motion_count / max(motion_events, 1)
+    
+    # Temperature features (default 20 when the window has none)
+    if temp_n > 0:
+        out[7] = temp_mean
+        out[8] = np.sqrt(temp_m2 / (temp_n - 1)) if temp_n > 1 else 0.0
+        out[9] = temp_min
+        out[10] = temp_max
+    else:
+        out[7] = out[8] = out[9] = out[10] = 20.0
+    
+    # Door features
+    out[11] = door_events
+    out[12] = door_open_count
+    
+    # Power features
+    if power_n > 0:
+        out[13] = power_sum
+        out[14] = power_sum / power_n
+        out[15] = power_max
+    else:
+        out[13] = out[14] = out[15] = 0.0
+    
+    # Activity level
+    out[16] = stype.shape[0]
+
+@njit(cache=True, fastmath=True)
+def _scale(x: np.ndarray, mean: np.ndarray, scale: np.ndarray, out: np.ndarray) -> None:
+    """StandardScaler.transform of a single feature vector, written into out."""
+    for i in range(x.shape[0]):
+        out[i] = (x[i] - mean[i]) / scale[i]
+
 class FeatureEngineering:
     """Extract features from sensor data for ML"""
     
@@ -26,6 +265,14 @@ class FeatureEngineering:
         self.config = config or self._get_default_config()
         self.window_size = self.config.get('window_size', 60)
         
+        # Sleep hours packed into a 24-bit mask (bit h set = hour h is sleep time)
+        sleep_start_hour = int(self.config['household']['sleep_start'].split(':')[0])
+        sleep_end_hour = int(self.config['household']['sleep_end'].split(':')[0])
+        self._sleep_hours_mask = 0
+        for h in range(24):
+            if h >= sleep_start_hour or h <= sleep_end_hour:
+                self._sleep_hours_mask |= 1 << h
+        
     def _get_default_config(self) -> Dict:
         """Get default configuration"""
         return {
@@ -40,107 +287,134 @@ class FeatureEngineering:
     def extract_features(self, sensor_data: List[Dict]) -> np.ndarray:
         """Extract features from a window of sensor data"""
         if not sensor_data:
-            return np.array([])
-        
-        features = []
+            return np.array([], dtype=np.float32)
         
-        # Convert to DataFrame for easier processing
-        df = pd.DataFrame(sensor_data)
-        
-        # Time-based features
-        latest_timestamp = sensor_data[-1]['timestamp']
-        current_time = datetime.fromisoformat(latest_timestamp)
+        return self.extract_range(SensorBuffer.from_events(sensor_data), 0, len(sensor_data))
+    
+    def _fill_time_features(self, out: np.ndarray, latest_ts):
+        """
+        Write the time features (slots 0-4) for wall-clock microsecond
+        timestamp(s) straight into a feature row, or a matrix's columns,
+        using integer arithmetic instead of building datetimes.
+        """
+        hour = latest_ts // _US_PER_HOUR % 24
+        day_of_week = (latest_ts // _US_PER_DAY + 3) % 7  # 1970-01-01 was a Thursday
+        
+        out[..., 0] = hour                                                # Hour of day (0-23)
+        out[..., 1] = day_of_week                                         # Day of week (0-6)
+        out[..., 2] = day_of_week >= 5                                    # Weekend flag
+        out[..., 3] = (self._sleep_hours_mask >> hour) & 1                # Sleep time flag
+        out[..., 4] = latest_ts // _US_PER_MINUTE % 60                    # Minute of hour
+    
+    def extract_range(self, buf: SensorBuffer, start: int, end: int) -> np.ndarray:
+        """Extract features from the events buf[start:end] (start < end)"""
+        features = np.zeros(20, dtype=np.float32)
         
-        # Basic time features
-        hour = current_time.hour
-        day_of_week = current_time.weekday()
-        is_weekend = day_of_week >= 5
+        # Time-based features of the latest event
+        self._fill_time_features(features, buf.ts[end - 1])
         
-        # Check if it's sleep time
-        sleep_start_hour = int(self.config['household']['sleep_start'].split(':')[0])
-        sleep_end_hour = int(self.config['household']['sleep_end'].split(':')[0])
-        is_sleep_time = hour >= sleep_start_hour or hour <= sleep_end_hour
-        
-        features.extend([
-            hour,                    # Hour of day (0-23)
-            day_of_week,            # Day of week (0-6)
-            int(is_weekend),        # Weekend flag
-            int(is_sleep_time),     # Sleep time flag
-            current_time.minute     # Minute of hour
-        ])
+        # Sensor features: one fused pass of the JIT kernel over the columns
+        rows = slice(start, end)
+        _aggregate_window(buf.stype[rows], buf.value_f[rows], buf.value_b[rows], features)
+        sensor_id = buf.sensor_id[rows]
+        features[17] = np.unique(sensor_id[sensor_id >= 0]).size
         
-        # Sensor-specific features
-        sensor_types = df['sensor_type'].unique() if 'sensor_type' in df else []
+        return features  # Always exactly 20 features (last two reserved)
+    
+    def create_feature_matrix(self, data_windows: List[List[Dict]]) -> np.ndarray:
+        """Create feature matrix from multiple data windows (empty ones are skipped)"""
+        windows = [w for w in data_windows if w]
+        buf = SensorBuffer(sum(map(len, windows)))
+        for window in windows:
+            buf.append_many(window)
+        
+        lengths = np.fromiter(map(len, windows), dtype=np.int64, count=len(windows))
+        ends = np.cumsum(lengths)
+        return self.range_feature_matrix(buf, ends - lengths, ends)
+    
+    def range_feature_matrix(self, buf: SensorBuffer, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        Feature matrix of the (possibly overlapping, non-empty) windows
+        buf[starts[i]:ends[i]].
+        
+        The windows' events are gathered into one flat stream and every
+        feature is computed as a segment-wise reduction over it
+        (bincount/reduceat), giving the same rows as extract_range.
+        """
+        n_windows = len(starts)
+        feature_matrix = np.zeros((n_windows, 20), dtype=np.float32)
+        if not n_windows:
+            return feature_matrix
+        
+        lengths = ends - starts
+        segment = np.repeat(np.arange(n_windows), lengths)
+        flat_offsets = np.cumsum(lengths) - lengths
+        rows = np.arange(int(lengths.sum())) + np.repeat(starts - flat_offsets, lengths)
+        stype = buf.stype[rows]
+        value_f = buf.value_f[rows]
+        value_b = buf.value_b[rows]
+        sensor_codes = buf.sensor_id[rows]
+        
+        # Time features of each window's latest event
+        self._fill_time_features(feature_matrix, buf.ts[ends - 1])
+        
+        def per_window(mask, weights=None):
+            return np.bincount(segment[mask], weights=None if weights is None else weights[mask],
+                               minlength=n_windows)
         
         # Motion features
-        motion_data = df[df['sensor_type'] == 'motion'] if 'motion' in sensor_types else pd.DataFrame()
-        if not motion_data.empty:
-            motion_count = len(motion_data[motion_data['value'] == True])
-            motion_frequency = motion_count / max(len(motion_data), 1)
-        else:
-            motion_count = 0
-            motion_frequency = 0
-        features.extend([motion_count, motion_frequency])
-        
-        # Temperature features
-        temp_data = df[df['sensor_type'] == 'temperature'] if 'temperature' in sensor_types else pd.DataFrame()
-        if not temp_data.empty and 'value' in temp_data:
-            temps = pd.to_numeric(temp_data['value'], errors='coerce').dropna()
-            if not temps.empty:
-                temp_mean = temps.mean()
-                temp_std = temps.std() if len(temps) > 1 else 0
-                temp_min = temps.min()
-                temp_max = temps.max()
-            else:
-                temp_mean = temp_std = temp_min = temp_max = 20  # Default values
-        else:
-            temp_mean = temp_std = temp_min = temp_max = 20
-        features.extend([temp_mean, temp_std, temp_min, temp_max])
+        is_motion = stype == MOTION
+        motion_events = per_window(is_motion)
+        motion_count = per_window(is_motion, value_b)
+        feature_matrix[:, 5] = motion_count
+        feature_matrix[:, 6] = motion_count / np.maximum(motion_events, 1)
         
         # Door features
-        door_data = df[df['sensor_type'] == 'door'] if 'door' in sensor_types else pd.DataFrame()
-        door_events = len(door_data)
-        door_open_count = len(door_data[door_data['value'] == 'open']) if not door_data.empty else 0
-        features.extend([door_events, door_open_count])
+        is_door = stype == DOOR
+        feature_matrix[:, 11] = per_window(is_door)
+        feature_matrix[:, 12] = per_window(is_door, value_b)
+        
+        has_value = ~np.isnan(value_f)
+        
+        # Temperature features (default 20 when the window has none)
+        is_temp = (stype == TEMPERATURE) & has_value
+        temp_n = per_window(is_temp)
+        temp_seg = segment[is_temp]
+        temps = value_f[is_temp]
+        has_temp = temp_n > 0
+        temp_mean = per_window(is_temp, value_f) / np.maximum(temp_n, 1)
+        temp_m2 = np.bincount(temp_seg, weights=(temps - temp_mean[temp_seg]) ** 2,
+                              minlength=n_windows)
+        feature_matrix[:, 7:11] = 20
+        feature_matrix[has_temp, 7] = temp_mean[has_temp]
+        feature_matrix[has_temp, 8] = np.where(
+            temp_n[has_temp] > 1, np.sqrt(temp_m2[has_temp] / np.maximum(temp_n[has_temp] - 1, 1)), 0
+        )
+        if temps.size:
+            # temps are grouped by window, so reduceat at each non-empty window's first value
+            temp_offsets = (np.cumsum(temp_n) - temp_n)[has_temp]
+            feature_matrix[has_temp, 9] = np.minimum.reduceat(temps, temp_offsets)
+            feature_matrix[has_temp, 10] = np.maximum.reduceat(temps, temp_offsets)
         
         # Power features
-        power_data = df[df['sensor_type'] == 'power'] if 'power' in sensor_types else pd.DataFrame()
-        if not power_data.empty and 'value' in power_data:
-            power_values = pd.to_numeric(power_data['value'], errors='coerce').dropna()
-            if not power_values.empty:
-                power_sum = power_values.sum()
-                power_mean = power_values.mean()
-                power_max = power_values.max()
-            else:
-                power_sum = power_mean = power_max = 0
-        else:
-            power_sum = power_mean = power_max = 0
-        features.extend([power_sum, power_mean, power_max])
-        
-        # Activity level features
-        total_events = len(df)
-        unique_sensors = df['sensor_id'].nunique() if 'sensor_id' in df else 0
-        features.extend([total_events, unique_sensors])
-        
-        # Ensure we always return the same number of features
-        while len(features) < 20:
-            features.append(0)
-        
-        return np.array(features[:20])  # Always return exactly 20 features
-    
-    def create_feature_matrix(self, data_windows: List[List[Dict]]) -> np.ndarray:
-        """Create feature matrix from multiple data windows"""
-        feature_matrix = []
-        
-        for window in data_windows:
-            features = self.extract_features(window)
-            if features.size > 0:
-                feature_matrix.append(features)
-        
-        if not feature_matrix:
-            return np.array([]).reshape(0, 20)
-        
-        return np.array(feature_matrix)
+        is_power = (stype == POWER) & has_value
+        power_n = per_window(is_power)
+        has_power = power_n > 0
+        power_sum = per_window(is_power, value_f)
+        feature_matrix[:, 13] = power_sum
+        feature_matrix[:, 14] = power_sum / np.maximum(power_n, 1)
+        if has_power.any():
+            power_offsets = (np.cumsum(power_n) - power_n)[has_power]
+            feature_matrix[has_power, 15] = np.maximum.reduceat(value_f[is_power], power_offsets)
+        
+        # Activity level features: events and distinct sensor ids per window
+        feature_matrix[:, 16] = lengths
+        has_id = sensor_codes >= 0
+        n_ids = int(sensor_codes.max()) + 1
+        window_ids = np.unique(segment[has_id] * n_ids + sensor_codes[has_id])
+        feature_matrix[:, 17] = np.bincount(window_ids // max(n_ids, 1), minlength=n_windows)
+        
+        return feature_matrix
     
     def get_feature_names(self) -> List[str]:
         """Get names of all features"""
@@ -164,6 +438,9 @@ class MLModelManager:
         self.scaler = StandardScaler()
         self.model_version = 0
         self.training_stats = {}
+        self.threshold = -0.5  # 5th percentile of training scores once trained
+        self._scale_buf = np.empty((1, 20), dtype=np.float32)
+        self._feature_names = np.array(self.feature_eng.get_feature_names())
         
     def _get_default_config(self) -> Dict:
         """Get default configuration"""
@@ -177,30 +454,31 @@ class MLModelManager:
             }
         }
     
+    def _cache_scaler(self):
+        """Keep float32 copies of the fitted scaler parameters for _scale"""
+        self._scaler_mean = self.scaler.mean_.astype(np.float32)
+        self._scaler_scale = self.scaler.scale_.astype(np.float32)
+    
     def create_sliding_windows(self, data: List[Dict], window_size: int = 60) -> List[List[Dict]]:
         """Create sliding windows from sensor data"""
         if not data:
             return []
         
-        windows = []
-        
-        # Sort data by timestamp
-        sorted_data = sorted(data, key=lambda x: x['timestamp'])
+        # Parse every timestamp once and sort by it
+        ts_us = np.fromiter((_timestamp_us(d['timestamp']) for d in data),
+                            dtype=np.int64, count=len(data))
+        order = np.argsort(ts_us, kind='stable')
+        sorted_data = [data[i] for i in order]
         
-        # Create overlapping windows
-        for i in range(0, len(sorted_data), max(1, window_size // 2)):  # 50% overlap
-            window_start = datetime.fromisoformat(sorted_data[i]['timestamp'])
-            window_end = window_start + timedelta(seconds=window_size)
-            
-            window = [
-                d for d in sorted_data[i:]
-                if datetime.fromisoformat(d['timestamp']) <= window_end
-            ]
-            
-            if len(window) >= 5:  # Minimum 5 data points per window
-                windows.append(window)
-        
-        return windows
+        starts, ends = self.window_ranges(ts_us[order], window_size)
+        return [sorted_data[s:e] for s, e in zip(starts.tolist(), ends.tolist())]
+    
+    def window_ranges(self, ts_us: np.ndarray, window_size: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+        """(starts, ends) index ranges of the sliding windows over sorted timestamps"""
+        # Overlapping windows; ends come from a binary search on the sorted times
+        starts, ends = _window_bounds(ts_us, window_size)
+        keep = ends - starts >= 5  # Minimum 5 data points per window
+        return starts[keep], ends[keep]
     
     def train_model(self, training_data: List[Dict]) -> Tuple[bool, str]:
         """Train the anomaly detection model"""
@@ -209,15 +487,19 @@ class MLModelManager:
         if len(training_data) < 20:
             return False, "Insufficient training data (need at least 20 samples)"
         
-        # Create sliding windows
-        windows = self.create_sliding_windows(training_data)
-        print(f"  📊 Created {len(windows)} training windows")
+        # Decode the events once into time-sorted columns
+        buf = SensorBuffer.from_events(training_data)
+        buf.sort_by_time()
+        
+        # Create sliding windows (index ranges into the buffer)
+        starts, ends = self.window_ranges(buf.ts)
+        print(f"  📊 Created {len(starts)} training windows")
         
-        if len(windows) < 5:
+        if len(starts) < 5:
             return False, "Insufficient windows for training"
         
         # Extract features
-        X = self.feature_eng.create_feature_matrix(windows)
+        X = self.feature_eng.range_feature_matrix(buf, starts, ends)
         print(f"  🔧 Extracted features: {X.shape}")
         
         if X.shape[0] < 5:
@@ -225,14 +507,19 @@ class MLModelManager:
         
         # Scale features
         X_scaled = self.scaler.fit_transform(X)
+        self._cache_scaler()
         
-        # Train Isolation Forest
+        # Train Isolation Forest, sized to the (usually small) window count:
+        # fewer trees for few windows, n_jobs=-1 builds and scores trees
+        # across all cores through joblib's thread pool
         contamination = self.config.get('contamination', 0.05)
+        n_samples = X_scaled.shape[0]
         self.model = IsolationForest(
             contamination=contamination,
             random_state=42,
-            n_estimators=100,
-            max_samples='auto'
+            n_estimators=int(np.clip(n_samples // 2, 32, 100)),
+            max_samples=min(256, n_samples),
+            n_jobs=-1
         )
         
         self.model.fit(X_scaled)
@@ -240,17 +527,19 @@ class MLModelManager:
         # Calculate training statistics
         predictions = self.model.predict(X_scaled)
         anomaly_scores = self.model.score_samples(X_scaled)
+        n_anomalies = int(np.count_nonzero(predictions == -1))
         
         self.training_stats = {
             'n_samples': X.shape[0],
             'n_features': X.shape[1],
-            'n_anomalies': sum(predictions == -1),
-            'anomaly_rate': sum(predictions == -1) / len(predictions),
+            'n_anomalies': n_anomalies,
+            'anomaly_rate': n_anomalies / predictions.size,
             'score_mean': float(np.mean(anomaly_scores)),
             'score_std': float(np.std(anomaly_scores)),
             'score_min': float(np.min(anomaly_scores)),
             'score_max': float(np.max(anomaly_scores))
         }
+        self.threshold = float(np.percentile(anomaly_scores, 5))
         
         self.model_version += 1
         
@@ -272,32 +561,59 @@ class MLModelManager:
             return False, 0.0, {"error": "No features extracted"}
         
         # Scale and predict
-        features_scaled = self.scaler.transform(features.reshape(1, -1))
-        prediction = self.model.predict(features_scaled)[0]
-        anomaly_score = self.model.score_samples(features_scaled)[0]
+        features_scaled = self._scale_buf
+        _scale(features, self._scaler_mean, self._scaler_scale, features_scaled[0])
+        is_anomalies, anomaly_scores = self._score(features_scaled)
+        is_anomaly = bool(is_anomalies[0])
+        anomaly_score = anomaly_scores[0]
         
         # Get feature importance (approximation based on deviation from mean)
-        feature_values = features_scaled[0]
-        feature_importance = {}
-        feature_names = self.feature_eng.get_feature_names()
-        
-        for i, (name, value) in enumerate(zip(feature_names, feature_values)):
-            if abs(value) > 1.5:  # More than 1.5 std from mean
-                feature_importance[name] = float(abs(value))
+        abs_values = np.abs(features_scaled[0])
+        outliers = np.flatnonzero(abs_values > 1.5)  # More than 1.5 std from mean
+        feature_importance = dict(zip(self._feature_names[outliers].tolist(),
+                                      abs_values[outliers].tolist()))
         
         # Prepare detailed results
         details = {
-            'prediction': 'anomaly' if prediction == -1 else 'normal',
+            'prediction': 'anomaly' if is_anomaly else 'normal',
             'anomaly_score': float(anomaly_score),
-            'threshold': float(np.percentile(self.model.score_samples(self.scaler.transform(self.feature_eng.create_feature_matrix(self.create_sliding_windows(sensor_data)))), 5)) if len(sensor_data) > 20 else -0.5,
+            'threshold': self.threshold,
             'feature_importance': feature_importance,
             'data_points': len(sensor_data)
         }
         
-        is_anomaly = prediction == -1
-        
         return is_anomaly, float(anomaly_score), details
     
+    def predict_batch(self, windows: List[List[Dict]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict many windows at once: one feature matrix, one scaler transform
+        and one model scoring call. Returns (is_anomaly, anomaly_scores) arrays,
+        one entry per non-empty window.
+        """
+        if self.model is None:
+            print("❌ No model trained")
+            return np.zeros(0, dtype=bool), np.zeros(0)
+        
+        X = self.feature_eng.create_feature_matrix(windows)
+        if X.shape[0] == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0)
+        
+        return self._score(self.scaler.transform(X))
+    
+    def _score(self, X_scaled: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Anomaly flags and scores from a single score_samples pass
+        (IsolationForest.predict flags scores below offset_)
+        """
+        if X_scaled.shape[0] >= PARALLEL_SCORE_MIN_ROWS:
+            # score_samples walks the trees sequentially unless a joblib
+            # backend says otherwise; tree traversal releases the GIL
+            with joblib.parallel_backend('threading', n_jobs=-1):
+                anomaly_scores = self.model.score_samples(X_scaled)
+        else:
+            anomaly_scores = self.model.score_samples(X_scaled)
+        return anomaly_scores < self.model.offset_, anomaly_scores
+    
     def save_model(self, filepath: str = "model.pkl") -> bool:
         """Save the trained model"""
         if self.model is None:
@@ -312,11 +628,14 @@ class MLModelManager:
                 'version': self.model_version,
                 'config': self.config,
                 'training_stats': self.training_stats,
+                'threshold': self.threshold,
                 'feature_names': self.feature_eng.get_feature_names(),
                 'timestamp': datetime.now().isoformat()
             }
             
-            joblib.dump(model_data, filepath)
+            # zlib level 3: the tree arrays compress several-fold for little
+            # CPU; joblib.load detects the compression on its own
+            joblib.dump(model_data, filepath, compress=('zlib', 3), protocol=5)
             print(f"💾 Model saved to {filepath}")
             return True
             
@@ -334,8 +653,10 @@ class MLModelManager:
             model_data = joblib.load(filepath)
             self.model = model_data['model']
             self.scaler = model_data['scaler']
+            self._cache_scaler()
             self.model_version = model_data.get('version', 0)
             self.training_stats = model_data.get('training_stats', {})
+            self.threshold = model_data.get('threshold', -0.5)
             
             print(f"✅ Model loaded from {filepath} (v{self.model_version})")
             return True
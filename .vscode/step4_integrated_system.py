@@ -4,20 +4,88 @@ This combines all components into a working system you can run locally
 No Raspberry Pi or MQTT broker needed!
 """
 
+import asyncio
 import json
+import math
 import os
 import time
 import threading
-import queue
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime
+from numpy.lib.stride_tricks import sliding_window_view
 from typing import Dict, List, Optional
 import random
+import shutil
 import numpy as np
-import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+try:
+    import orjson
+except ImportError:  # optional: fall back to stdlib json
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; kernels run as plain Python without it
+    def njit(*args, **kwargs):
+        def decorator(fn):
+            return fn
+        return decorator
+
+# Most recent samples kept for windowed anomaly detection
+SENSOR_BUFFER_SIZE = 1000
+
+# Integer sensor type ids, stamped on each sample as '_tid' when it arrives
+SENSOR_TYPE_IDS = {'temperature': 0, 'motion': 1, 'power': 2, 'door': 3}
+
+# Types with ids below this are summarized by mean/std features, in id order
+STAT_SENSOR_TYPES = 3
+
+@njit(cache=True, boundscheck=False)
+def _window_stats(type_ids: np.ndarray, values: np.ndarray, id_codes: np.ndarray,
+                  out: np.ndarray) -> None:
+    """Fill the sensor features (out[2:10]) of one window in a single pass."""
+    count = np.zeros(STAT_SENSOR_TYPES, dtype=np.int64)
+    mean = np.zeros(STAT_SENSOR_TYPES)
+    m2 = np.zeros(STAT_SENSOR_TYPES)
+    
+    for i in range(type_ids.shape[0]):
+        slot = type_ids[i]
+        v = values[i]
+        if slot < 0 or slot >= STAT_SENSOR_TYPES or np.isnan(v):
+            continue
+        # Welford's running mean / sum of squared deviations
+        count[slot] += 1
+        delta = v - mean[slot]
+        mean[slot] += delta / count[slot]
+        m2[slot] += delta * (v - mean[slot])
+    
+    # Sensor statistics: mean and sample std (0 for fewer than two values)
+    for slot in range(STAT_SENSOR_TYPES):
+        if count[slot] > 0:
+            out[2 + 2 * slot] = mean[slot]
+        if count[slot] > 1:
+            out[3 + 2 * slot] = np.sqrt(m2[slot] / (count[slot] - 1))
+    
+    # Total events and distinct sensor ids (samples without an id are -1)
+    ids = np.sort(id_codes)
+    distinct = 0
+    for i in range(ids.shape[0]):
+        if ids[i] >= 0 and (i == 0 or ids[i] != ids[i - 1]):
+            distinct += 1
+    out[8] = type_ids.shape[0]
+    out[9] = distinct
+
+# Kinds of anomaly the simulator injects in normal mode
+INJECTED_ANOMALY_TYPES = ('temperature', 'power', 'motion')
+
+# Streaming detection scores windows in batches of this many samples,
+# holding none back for longer than DETECTION_MAX_DELAY seconds
+DETECTION_BATCH_SIZE = 8
+DETECTION_MAX_DELAY = 1.0
+
 # ======================== INTEGRATED SYSTEM ========================
 class IoTMLSystemLocal:
     """Complete IoT ML System for local development"""
@@ -32,24 +100,46 @@ class IoTMLSystemLocal:
         
         # Initialize components
         self.config = self._load_config()
+        self._state_lock = threading.Lock()  # Saves come from the loop, worker and main threads
         self.state = self._load_state()
         self.mode = self.state.get('mode', 'training')
+        self._state_dirty = False  # State changed since it was last written
         
         # Data structures
-        self.sensor_buffer = []
+        self.sensor_buffer = deque(maxlen=SENSOR_BUFFER_SIZE)
+        # Epoch seconds of the buffered samples: the last len(sensor_buffer)
+        # entries before sensor_n, slid back to the front when the array fills
+        self.sensor_ts = np.empty(2 * SENSOR_BUFFER_SIZE)
+        # Feature columns of the same samples, kept in step with sensor_ts
+        self.sensor_tid = np.empty(2 * SENSOR_BUFFER_SIZE, dtype=np.int8)
+        self.sensor_value = np.empty(2 * SENSOR_BUFFER_SIZE)
+        self.sensor_code = np.empty(2 * SENSOR_BUFFER_SIZE, dtype=np.int64)
+        self.sensor_n = 0
+        self._sensor_codes = {None: -1}  # Sensor id -> small integer code
         self.training_data = []
+        self._train_start_mono = None  # time.monotonic() at state['training_start']
         self.anomaly_log = []
-        self.data_queue = queue.Queue()
+        self._anom_fp = None  # data/anomalies.json, open while running
+        self.data_queue = None  # Simulator -> processor asyncio.Queue, made per loop run
+        self._pending_feats = []  # Window features awaiting a batched score
+        self._pending_meta = []  # Samples the pending windows ended on
+        self._pending_since = 0.0
         
         # ML components
         self.model = None
         self.scaler = StandardScaler()
+        # Fitted scaler statistics as plain arrays: scaling a window is then
+        # one subtract and multiply, without transform()'s input validation
+        self._scaler_mean = None
+        self._inv_scale = None
         self.model_version = 0
         
         # Control flags
         self.running = False
-        self.simulator_thread = None
-        self.processor_thread = None
+        self.loop_thread = None  # Runs the event loop hosting both tasks
+        self._rng = np.random.default_rng()  # Simulator randomness, drawn per tick
+        self._loop = None
+        self._simulator_task = None
         
         print(f"  ✅ System initialized in {self.mode.upper()} mode")
     
@@ -98,24 +188,44 @@ class IoTMLSystemLocal:
         """Save system state"""
         if state:
             self.state = state
-        with open('system_state.json', 'w') as f:
-            json.dump(self.state, f, indent=2)
+        with self._state_lock:
+            self._state_dirty = False
+            # Write a temp file and swap it in, so an interrupted save never
+            # leaves a truncated state file behind
+            tmp_file = 'system_state.json.tmp'
+            if orjson is not None:
+                with open(tmp_file, 'wb') as f:
+                    f.write(orjson.dumps(self.state, option=orjson.OPT_INDENT_2))
+            else:
+                with open(tmp_file, 'w') as f:
+                    json.dump(self.state, f, indent=2)
+            os.replace(tmp_file, 'system_state.json')
     
     # ======================== SENSOR SIMULATION ========================
-    def _simulate_sensors(self):
+    async def _simulate_sensors(self):
         """Simulate sensor data generation"""
         while self.running:
-            current_hour = datetime.now().hour
+            # One clock read per tick: every reading in it shares the timestamp
+            now = datetime.now()
+            now_iso = now.isoformat()
+            current_hour = now.hour
+            
+            # All of the tick's random draws in a few vectorized calls
+            rng = self._rng
+            # motion, motion rooms 1-2, door, power, anomaly, anomaly kind/value,
+            # door state, sleep until the next tick
+            gates = rng.random(10)
+            base_temp = 21 if 7 <= current_hour <= 22 else 19
+            temps = base_temp + rng.normal(0, 1.5, size=3)
+            power_noise = rng.uniform(-50, 50, size=3)
             
             # Generate various sensor data
             sensor_data = []
             
             # Temperature sensors
-            for room_id in range(1, 4):
-                base_temp = 21 if 7 <= current_hour <= 22 else 19
-                temp = base_temp + random.gauss(0, 1.5)
+            for room_id, temp in enumerate(temps.tolist(), start=1):
                 sensor_data.append({
-                    'timestamp': datetime.now().isoformat(),
+                    'timestamp': now_iso,
                     'sensor_type': 'temperature',
                     'sensor_id': f'temp_{room_id}',
                     'value': round(temp, 1),
@@ -123,12 +233,12 @@ class IoTMLSystemLocal:
                 })
             
             # Motion sensors
-            if random.random() < 0.3:
+            if gates[0] < 0.3:
                 motion_prob = 0.7 if 7 <= current_hour <= 22 else 0.1
                 for room_id in range(1, 3):
-                    if random.random() < motion_prob:
+                    if gates[room_id] < motion_prob:
                         sensor_data.append({
-                            'timestamp': datetime.now().isoformat(),
+                            'timestamp': now_iso,
                             'sensor_type': 'motion',
                             'sensor_id': f'motion_{room_id}',
                             'value': True,
@@ -136,26 +246,26 @@ class IoTMLSystemLocal:
                         })
             
             # Door sensor
-            if random.random() < 0.1:
+            if gates[3] < 0.1:
                 sensor_data.append({
-                    'timestamp': datetime.now().isoformat(),
+                    'timestamp': now_iso,
                     'sensor_type': 'door',
                     'sensor_id': 'door_front',
-                    'value': random.choice(['open', 'closed']),
+                    'value': 'open' if gates[8] < 0.5 else 'closed',
                     'location': 'entrance'
                 })
             
             # Power sensors
-            if random.random() < 0.2:
+            if gates[4] < 0.2:
                 appliances = [
                     ('oven', 1500 if 11 <= current_hour <= 13 or 17 <= current_hour <= 20 else 50),
                     ('tv', 200 if 19 <= current_hour <= 23 else 10),
                     ('washer', 2000 if 9 <= current_hour <= 11 else 0)
                 ]
-                for appliance, base_power in appliances:
-                    power = base_power + random.uniform(-50, 50) if base_power > 0 else 0
+                for (appliance, base_power), noise in zip(appliances, power_noise.tolist()):
+                    power = base_power + noise if base_power > 0 else 0
                     sensor_data.append({
-                        'timestamp': datetime.now().isoformat(),
+                        'timestamp': now_iso,
                         'sensor_type': 'power',
                         'sensor_id': f'power_{appliance}',
                         'value': max(0, round(power, 1)),
@@ -163,28 +273,28 @@ class IoTMLSystemLocal:
                     })
             
             # Inject anomalies occasionally (for testing)
-            if self.mode == 'normal' and random.random() < 0.05:  # 5% anomaly rate
-                anomaly_type = random.choice(['temperature', 'power', 'motion'])
+            if self.mode == 'normal' and gates[5] < 0.05:  # 5% anomaly rate
+                anomaly_type = INJECTED_ANOMALY_TYPES[int(gates[6] * len(INJECTED_ANOMALY_TYPES))]
                 
                 if anomaly_type == 'temperature':
                     sensor_data.append({
-                        'timestamp': datetime.now().isoformat(),
+                        'timestamp': now_iso,
                         'sensor_type': 'temperature',
                         'sensor_id': 'temp_anomaly',
-                        'value': random.choice([5, 40]),  # Extreme temperature
+                        'value': 5 if gates[7] < 0.5 else 40,  # Extreme temperature
                         'location': 'unknown'
                     })
                 elif anomaly_type == 'power':
                     sensor_data.append({
-                        'timestamp': datetime.now().isoformat(),
+                        'timestamp': now_iso,
                         'sensor_type': 'power',
                         'sensor_id': 'power_anomaly',
-                        'value': random.uniform(4000, 6000),  # Very high power
+                        'value': 4000 + 2000 * float(gates[7]),  # Very high power
                         'location': 'unknown'
                     })
                 elif anomaly_type == 'motion' and (current_hour < 6 or current_hour > 23):
                     sensor_data.append({
-                        'timestamp': datetime.now().isoformat(),
+                        'timestamp': now_iso,
                         'sensor_type': 'motion',
                         'sensor_id': 'motion_night',
                         'value': True,
@@ -193,63 +303,123 @@ class IoTMLSystemLocal:
             
             # Add to queue
             for data in sensor_data:
-                self.data_queue.put(data)
+                self.data_queue.put_nowait(data)
             
-            time.sleep(random.uniform(1, 3))  # Vary data rate
+            await asyncio.sleep(1 + 2 * float(gates[9]))  # Vary data rate
     
     # ======================== DATA PROCESSING ========================
-    def _process_data(self):
+    async def _process_data(self):
         """Process incoming sensor data"""
         while self.running:
             try:
-                # Get data from queue
-                data = self.data_queue.get(timeout=1)
-                
-                # Add to buffer
-                self.sensor_buffer.append(data)
-                if len(self.sensor_buffer) > 1000:
-                    self.sensor_buffer = self.sensor_buffer[-500:]  # Keep last 500
-                
-                # Process based on mode
-                if self.mode == 'training':
-                    self._process_training_data(data)
-                elif self.mode == 'normal':
-                    self._process_normal_data(data)
-                
-                # Display current data
-                self._display_data(data)
-                
-            except queue.Empty:
-                continue
+                data = self.data_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                try:
+                    data = await asyncio.wait_for(self.data_queue.get(), timeout=1)
+                except asyncio.TimeoutError:
+                    # Idle: nothing else is coming to fill the batch
+                    self._flush_detections()
+                    continue
+            
+            try:
+                if self._process_sample(data):
+                    # Fitting and saving block; run them off the loop so the
+                    # sensors keep ticking meanwhile
+                    await asyncio.to_thread(self._complete_training)
             except Exception as e:
                 print(f"❌ Processing error: {e}")
+        
+        self._flush_detections()
+    
+    def _process_sample(self, data: Dict) -> bool:
+        """Buffer and handle one sample; True once training should complete"""
+        # Add to buffer, parsing the timestamp and type once
+        data['_tid'] = SENSOR_TYPE_IDS.get(data['sensor_type'], -1)
+        latest = datetime.fromisoformat(data['timestamp'])
+        ts = latest.timestamp()
+        self._buffer_sample(data, ts)
+        
+        # Process based on mode
+        complete = False
+        if self.mode == 'training':
+            complete = self._process_training_data(data)
+        elif self.mode == 'normal':
+            self._process_normal_data(data, latest, ts)
+        
+        # Display current data
+        self._display_data(data)
+        return complete
+    
+    def _buffer_sample(self, data: Dict, ts: float):
+        """Append a sample to the ring buffer (the deque evicts the oldest when full)"""
+        n = self.sensor_n
+        if n == self.sensor_ts.shape[0]:
+            live = len(self.sensor_buffer)
+            for column in (self.sensor_ts, self.sensor_tid, self.sensor_value, self.sensor_code):
+                column[:live] = column[n - live:n]
+            n = live
+        self.sensor_buffer.append(data)
+        self.sensor_ts[n] = ts
+        self.sensor_tid[n], self.sensor_value[n], self.sensor_code[n] = \
+            self._sample_columns(data, self._sensor_codes)
+        self.sensor_n = n + 1
     
-    def _process_training_data(self, data: Dict):
-        """Process data in training mode"""
+    def _process_training_data(self, data: Dict) -> bool:
+        """Process data in training mode; True once training should complete"""
         self.training_data.append(data)
         self.state['training_samples'] = len(self.training_data)
         
         # Check if training should complete
-        if self._should_complete_training():
-            self._complete_training()
+        return self._should_complete_training()
     
-    def _process_normal_data(self, data: Dict):
-        """Process data in normal mode (anomaly detection)"""
-        # Get recent window
+    def _process_normal_data(self, data: Dict, latest: datetime, ts: float):
+        """Process data in normal mode (anomaly detection); latest and ts are
+        data's parsed timestamp and its epoch time"""
+        # Get recent window: the buffer is in time order, so binary search its start
         window_size = self.config['anomaly_detection']['window_size']
-        current_time = datetime.fromisoformat(data['timestamp'])
-        window_start = current_time - timedelta(seconds=window_size)
+        end = self.sensor_n
+        first = end - len(self.sensor_buffer)
+        start = first + int(np.searchsorted(self.sensor_ts[first:end], ts - window_size))
+        
+        if end - start >= 5 and self.model:
+            # Features straight from the buffered columns (the window ends on data)
+            features = np.zeros(10, dtype=np.float32)
+            features[0] = latest.hour
+            features[1] = latest.minute
+            _window_stats(self.sensor_tid[start:end], self.sensor_value[start:end],
+                          self.sensor_code[start:end], features)
+            
+            # Queue for detection; windows are scored in batches
+            if not self._pending_feats:
+                self._pending_since = time.monotonic()
+            self._pending_feats.append(features)
+            self._pending_meta.append(data)
+        
+        if (len(self._pending_feats) >= DETECTION_BATCH_SIZE or
+                time.monotonic() - self._pending_since >= DETECTION_MAX_DELAY):
+            self._flush_detections()
+    
+    def _flush_detections(self):
+        """Score all pending windows in one call and handle the anomalies"""
+        if not self._pending_feats:
+            return
         
-        window_data = [
-            d for d in self.sensor_buffer
-            if datetime.fromisoformat(d['timestamp']) >= window_start
-        ]
+        features = np.vstack(self._pending_feats)
+        samples = self._pending_meta
+        self._pending_feats = []
+        self._pending_meta = []
         
-        if len(window_data) >= 5 and self.model:
-            # Perform anomaly detection
-            is_anomaly, score, details = self._detect_anomaly(window_data)
-            
-            if is_anomaly:
+        if not self.model:
+            return
+        
+        scores = self._score(features)
+        for data, row, score in zip(samples, features, scores):
+            if score < self.model.offset_:
+                details = {
+                    'prediction': 'anomaly',
+                    'score': float(score),
+                    'features': row.tolist()
+                }
                 self._handle_anomaly(data, score, details)
     
     def _should_complete_training(self) -> bool:
@@ -260,11 +430,9 @@ class IoTMLSystemLocal:
             return True
         
         # Check duration
-        if self.state.get('training_start'):
-            start = datetime.fromisoformat(self.state['training_start'])
-            duration = datetime.now() - start
+        if self._train_start_mono is not None:
             max_duration = self.config['training']['duration_hours'] * 3600
-            if duration.total_seconds() >= max_duration:
+            if time.monotonic() - self._train_start_mono >= max_duration:
                 return True
         
         return False
@@ -295,38 +463,97 @@ class IoTMLSystemLocal:
             print("❌ Training failed, continuing in training mode")
     
     # ======================== ML FUNCTIONS ========================
+    @staticmethod
+    def _type_id(data: Dict) -> int:
+        """Sensor type id of a sample, -1 for unknown types"""
+        tid = data.get('_tid')
+        if tid is None:  # Not stamped on arrival, e.g. training data fed in directly
+            tid = SENSOR_TYPE_IDS.get(data.get('sensor_type'), -1)
+        return tid
+    
+    @classmethod
+    def _sample_columns(cls, data: Dict, codes: Dict) -> tuple:
+        """Type id, numeric value (NaN unless a usable statistics reading) and
+        sensor id code of a sample; codes maps sensor ids to codes and grows"""
+        tid = cls._type_id(data)
+        code = codes.setdefault(data.get('sensor_id'), len(codes))
+        value = math.nan
+        if 0 <= tid < STAT_SENSOR_TYPES:
+            try:
+                value = float(data.get('value'))
+            except (TypeError, ValueError):
+                pass  # Non-numeric readings are ignored
+        return tid, value, code
+    
+    @classmethod
+    def _columns(cls, samples: List[Dict]) -> tuple:
+        """Type id, value and sensor id code columns of samples"""
+        tids = np.empty(len(samples), dtype=np.int8)
+        values = np.empty(len(samples))
+        id_codes = np.empty(len(samples), dtype=np.int64)
+        codes = {None: -1}
+        for i, d in enumerate(samples):
+            tids[i], values[i], id_codes[i] = cls._sample_columns(d, codes)
+        return tids, values, id_codes
+    
     def _extract_features(self, sensor_data: List[Dict]) -> np.ndarray:
-        """Simple feature extraction"""
-        features = []
+        """Simple feature extraction (one compiled pass over the window, no DataFrame)"""
+        features = np.zeros(10, dtype=np.float32)
         
         if not sensor_data:
-            return np.zeros(10)
-        
-        df = pd.DataFrame(sensor_data)
+            return features
         
         # Time features
         latest = datetime.fromisoformat(sensor_data[-1]['timestamp'])
-        features.append(latest.hour)
-        features.append(latest.minute)
-        
-        # Sensor statistics
-        for sensor_type in ['temperature', 'motion', 'power']:
-            type_data = df[df['sensor_type'] == sensor_type] if 'sensor_type' in df else pd.DataFrame()
-            
-            if not type_data.empty and 'value' in type_data:
-                values = pd.to_numeric(type_data['value'], errors='coerce').dropna()
-                if not values.empty:
-                    features.extend([values.mean(), values.std() if len(values) > 1 else 0])
-                else:
-                    features.extend([0, 0])
-            else:
-                features.extend([0, 0])
+        features[0] = latest.hour
+        features[1] = latest.minute
         
-        # Total events
-        features.append(len(df))
-        features.append(df['sensor_id'].nunique() if 'sensor_id' in df else 0)
+        tids, values, id_codes = self._columns(sensor_data)
+        _window_stats(tids, values, id_codes, features)
         
-        return np.array(features[:10])  # Return exactly 10 features
+        return features  # Exactly 10 features
+    
+    def _window_features(self, samples: List[Dict], window_size: int, step: int) -> np.ndarray:
+        """_extract_features of each window samples[i:i+window_size], for i in
+        range(0, len(samples) - window_size, step), computed for all windows at once"""
+        starts = range(0, len(samples) - window_size, step)
+        X = np.zeros((len(starts), 10), dtype=np.float32)
+        if not len(starts):
+            return X
+        
+        tids, values, id_codes = self._columns(samples)
+        
+        # (windows, window_size) views, no copies
+        end = starts[-1] + window_size
+        slot_w = sliding_window_view(tids[:end], window_size)[::step]
+        value_w = sliding_window_view(values[:end], window_size)[::step]
+        id_w = sliding_window_view(id_codes[:end], window_size)[::step]
+        
+        # Time features of each window's latest sample
+        for row, i in enumerate(starts):
+            latest = datetime.fromisoformat(samples[i + window_size - 1]['timestamp'])
+            X[row, 0] = latest.hour
+            X[row, 1] = latest.minute
+        
+        # Sensor statistics: mean and sample std (0 for fewer than two values)
+        valid = ~np.isnan(value_w)
+        for slot in range(STAT_SENSOR_TYPES):
+            mask = valid & (slot_w == slot)
+            n = mask.sum(axis=1)
+            masked = np.where(mask, value_w, 0.0)
+            mean = masked.sum(axis=1) / np.maximum(n, 1)
+            dev = np.where(mask, value_w - mean[:, None], 0.0)
+            var = (dev * dev).sum(axis=1) / np.maximum(n - 1, 1)
+            X[:, 2 + 2 * slot] = mean
+            X[:, 3 + 2 * slot] = np.sqrt(var)
+        
+        # Total events and distinct sensor ids (samples without an id sort first)
+        ids_sorted = np.sort(id_w, axis=1)
+        X[:, 8] = window_size
+        X[:, 9] = ((ids_sorted[:, 1:] != ids_sorted[:, :-1]).sum(axis=1) + 1
+                   - (ids_sorted[:, 0] == -1))
+        
+        return X
     
     def _train_model(self) -> bool:
         """Train the ML model"""
@@ -336,28 +563,24 @@ class IoTMLSystemLocal:
         
         print(f"🎯 Training model with {len(self.training_data)} samples...")
         
-        # Create windows
-        windows = []
+        # Extract features of every window
         window_size = 10  # Simplified window size
+        X = self._window_features(self.training_data, window_size, 5)
         
-        for i in range(0, len(self.training_data) - window_size, 5):
-            windows.append(self.training_data[i:i+window_size])
-        
-        if len(windows) < 5:
+        if len(X) < 5:
             print("❌ Insufficient windows")
             return False
         
-        # Extract features
-        X = np.array([self._extract_features(w) for w in windows])
-        
         # Scale features
         X_scaled = self.scaler.fit_transform(X)
+        self._cache_scaler()
         
         # Train model
         self.model = IsolationForest(
             contamination=self.config['anomaly_detection']['contamination'],
             random_state=42,
-            n_estimators=50
+            n_estimators=50,
+            n_jobs=-1  # Build trees on all cores
         )
         self.model.fit(X_scaled)
         self.model_version += 1
@@ -365,18 +588,19 @@ class IoTMLSystemLocal:
         print(f"✅ Model trained successfully (version {self.model_version})")
         return True
     
+    def _cache_scaler(self):
+        """Keep the fitted scaler's mean and inverse scale as plain arrays"""
+        self._scaler_mean = self.scaler.mean_.astype(np.float32)
+        self._inv_scale = (1.0 / self.scaler.scale_).astype(np.float32)
+    
     def _detect_anomaly(self, sensor_data: List[Dict]) -> tuple:
         """Detect anomalies in sensor data"""
         if not self.model:
             return False, 0.0, {}
         
         features = self._extract_features(sensor_data)
-        features_scaled = self.scaler.transform(features.reshape(1, -1))
-        
-        prediction = self.model.predict(features_scaled)[0]
-        score = self.model.score_samples(features_scaled)[0]
-        
-        is_anomaly = prediction == -1
+        score = self._score(features.reshape(1, -1))[0]
+        is_anomaly = score < self.model.offset_
         
         details = {
             'prediction': 'anomaly' if is_anomaly else 'normal',
@@ -386,6 +610,13 @@ class IoTMLSystemLocal:
         
         return is_anomaly, score, details
     
+    def _score(self, features: np.ndarray) -> np.ndarray:
+        """Anomaly scores for rows of raw features"""
+        features_scaled = (features - self._scaler_mean) * self._inv_scale
+        
+        # One pass over the trees: predict() flags exactly the scores below offset_
+        return self.model.score_samples(features_scaled)
+    
     def _handle_anomaly(self, data: Dict, score: float, details: Dict):
         """Handle detected anomaly"""
         self.state['total_anomalies'] = self.state.get('total_anomalies', 0) + 1
@@ -407,10 +638,19 @@ class IoTMLSystemLocal:
         print(f"  Score: {score:.3f}")
         
         # Save to file
-        with open('data/anomalies.json', 'a') as f:
-            f.write(json.dumps(anomaly_info) + '\n')
+        if orjson is not None:
+            line = orjson.dumps(anomaly_info, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n'
+        else:
+            line = (json.dumps(anomaly_info) + '\n').encode()
+        if self._anom_fp is not None:
+            self._anom_fp.write(line)
+            self._anom_fp.flush()
+        else:
+            with open('data/anomalies.json', 'ab') as f:
+                f.write(line)
         
-        self._save_state()
+        # Written with the next status update (or on stop), not per anomaly
+        self._state_dirty = True
     
     def _save_model(self):
         """Save the trained model"""
@@ -420,13 +660,28 @@ class IoTMLSystemLocal:
         model_data = {
             'model': self.model,
             'scaler': self.scaler,
+            'scaler_mean': self._scaler_mean,
+            'inv_scale': self._inv_scale,
             'version': self.model_version,
             'timestamp': datetime.now().isoformat()
         }
         
         filename = f"models/model_v{self.model_version}.pkl"
-        joblib.dump(model_data, filename)
-        joblib.dump(model_data, "models/model_latest.pkl")
+        latest = "models/model_latest.pkl"
+        
+        # Serialize once; model_latest.pkl is a hard link to the same file
+        # (a copy where links are unsupported). Both are swapped in whole,
+        # so a reader never sees a half-written model.
+        tmp, latest_tmp = filename + '.tmp', latest + '.tmp'
+        joblib.dump(model_data, tmp, compress=('zlib', 3), protocol=5)
+        if os.path.exists(latest_tmp):
+            os.remove(latest_tmp)
+        try:
+            os.link(tmp, latest_tmp)
+        except OSError:
+            shutil.copyfile(tmp, latest_tmp)
+        os.replace(tmp, filename)
+        os.replace(latest_tmp, latest)
         
         print(f"💾 Model saved: {filename}")
     
@@ -436,6 +691,11 @@ class IoTMLSystemLocal:
             model_data = joblib.load("models/model_latest.pkl")
             self.model = model_data['model']
             self.scaler = model_data['scaler']
+            if 'inv_scale' in model_data:
+                self._scaler_mean = model_data['scaler_mean'].astype(np.float32, copy=False)
+                self._inv_scale = model_data['inv_scale'].astype(np.float32, copy=False)
+            else:  # Saved before the statistics were stored alongside
+                self._cache_scaler()
             self.model_version = model_data['version']
             print(f"✅ Model loaded (version {self.model_version})")
             return True
@@ -469,6 +729,9 @@ class IoTMLSystemLocal:
             print(f"\nRecent Anomalies:")
             for anomaly in self.anomaly_log[-5:]:
                 print(f"  - {anomaly['timestamp']}: {anomaly['sensor']} = {anomaly['value']}")
+        
+        if self._state_dirty:
+            self._save_state()
     
     # ======================== CONTROL FUNCTIONS ========================
     def start(self):
@@ -489,16 +752,20 @@ class IoTMLSystemLocal:
                 self.state['training_start'] = datetime.now().isoformat()
                 self._save_state()
         
-        self.running = True
+        # Training duration is checked against the monotonic clock; the ISO
+        # start (possibly from an earlier run) is parsed only here
+        if self.mode == 'training' and self.state.get('training_start'):
+            start = datetime.fromisoformat(self.state['training_start'])
+            elapsed = (datetime.now() - start).total_seconds()
+            self._train_start_mono = time.monotonic() - elapsed
         
-        # Start threads
-        self.simulator_thread = threading.Thread(target=self._simulate_sensors)
-        self.simulator_thread.daemon = True
-        self.simulator_thread.start()
+        self.running = True
+        self._anom_fp = open('data/anomalies.json', 'ab')
         
-        self.processor_thread = threading.Thread(target=self._process_data)
-        self.processor_thread.daemon = True
-        self.processor_thread.start()
+        # Start the event loop thread
+        self.loop_thread = threading.Thread(target=self._run_loop)
+        self.loop_thread.daemon = True
+        self.loop_thread.start()
         
         print(f"✅ System started in {self.mode.upper()} mode")
         
@@ -511,20 +778,56 @@ class IoTMLSystemLocal:
         print("\n🛑 Stopping system...")
         self.running = False
         
-        if self.simulator_thread:
-            self.simulator_thread.join(timeout=2)
-        if self.processor_thread:
-            self.processor_thread.join(timeout=2)
+        if self._loop and self._simulator_task:
+            try:
+                # Wake the simulator from its sleep instead of waiting it out
+                self._loop.call_soon_threadsafe(self._simulator_task.cancel)
+            except RuntimeError:
+                pass  # Loop already finished
+        if self.loop_thread:
+            self.loop_thread.join(timeout=2)
+        
+        if self._anom_fp is not None:
+            self._anom_fp.close()
+            self._anom_fp = None
         
         self._save_state()
         print("✅ System stopped")
     
+    def _run_loop(self):
+        """Run the simulator and the processor as tasks on one event loop"""
+        asyncio.run(self._run_tasks())
+    
+    async def _run_tasks(self):
+        """Simulator and processor tasks; returns once both have finished"""
+        self._loop = asyncio.get_running_loop()
+        # A queue is bound to the loop that first waits on it, so every
+        # start() gets a fresh one on its own loop
+        self.data_queue = asyncio.Queue()
+        self._simulator_task = asyncio.create_task(self._simulate_sensors())
+        processor_task = asyncio.create_task(self._process_data())
+        
+        # If either task fails, stop the other rather than run on half a system
+        done, pending = await asyncio.wait(
+            (self._simulator_task, processor_task), return_when=asyncio.FIRST_EXCEPTION
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._loop = None
+        
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                self.running = False
+                print(f"❌ {task.get_coro().__name__} stopped: {task.exception()!r}")
+    
     def reset(self):
         """Reset the system to training mode"""
         print("\n🔄 Resetting system...")
         
         self.mode = 'training'
         self.training_data = []
+        self._train_start_mono = None
         self.anomaly_log = []
         self.model = None
         self.model_version = 0